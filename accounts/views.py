@@ -1,3 +1,5 @@
+import logging
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages, auth
 from django.contrib.auth.decorators import login_required
@@ -5,9 +7,12 @@ from django.contrib.auth import update_session_auth_hash
 from .forms import RegistrationForm
 from .models import Account
 from orders.models import Order, OrderProduct
-from carts.models import Cart, CartItem
+from carts.models import Cart
+from carts import operations
 from carts.views import _cart_id
 
+logger = logging.getLogger(__name__)
+
 
 def register(request):
     if request.method == 'POST':
@@ -49,65 +54,30 @@ def login(request):
         user = auth.authenticate(email=email, password=password)
 
         if user is not None:
-            # Get or merge cart before login
+            # Merge the visitor's cart into the user's before the session key changes:
+            # a cart saved under the session before anonymous carts moved out of
+            # the database, then the anonymous cart storage (carts.storage).
+            cart_id = _cart_id(request)
             try:
-                # Check if user has existing cart
-                user_cart = Cart.objects.filter(user=user, is_active=True).first()
-                
-                # Check for session cart
-                session_cart = Cart.objects.filter(cart_id=_cart_id(request), user__isnull=True).first()
-                
-                if session_cart and user_cart:
-                    # Merge session cart items with user cart
-                    session_items = CartItem.objects.filter(cart=session_cart)
-                    
-                    for session_item in session_items:
-                        try:
-                            # Check if product already exists in user cart
-                            user_item = CartItem.objects.get(
-                                cart=user_cart,
-                                product=session_item.product,
-                                user=user
-                            )
-                            # Add quantities together (respecting stock limits)
-                            new_quantity = user_item.quantity + session_item.quantity
-                            if new_quantity <= session_item.product.stock:
-                                user_item.quantity = new_quantity
-                            else:
-                                user_item.quantity = session_item.product.stock
-                                messages.warning(request, f'{session_item.product.product_name}: Maximum stock limit reached.')
-                            user_item.check_stock_availability()
-                            user_item.save()
-                        except CartItem.DoesNotExist:
-                            # Move session item to user cart
-                            session_item.cart = user_cart
-                            session_item.user = user
-                            session_item.check_stock_availability()
-                            session_item.save()
-                    
-                    # Delete session cart after merge
-                    session_cart.delete()
-                    messages.info(request, 'Your cart has been updated with previous items.')
-                    
-                elif session_cart and not user_cart:
-                    # Assign session cart to user
-                    session_cart.user = user
-                    session_cart.save()
-                    
-                    # Update all cart items with user
-                    CartItem.objects.filter(cart=session_cart).update(user=user)
-                    
-                elif user_cart and not session_cart:
-                    # User has existing cart, just load it
-                    cart_count = user_cart.get_total_items()
-                    if cart_count > 0:
-                        messages.info(request, f'Welcome back! You have {cart_count} item(s) in your cart.')
-                        
-            except Exception as e:
-                # If any error occurs, just continue with login
-                print(f"Cart merge error: {e}")
-                pass
-            
+                session_cart = Cart.objects.filter(cart_id=cart_id, user__isnull=True).first() if cart_id else None
+                merged = session_cart is not None or len(request.anonymous_cart) > 0
+                capped = operations.merge_cart(session_cart, user) if session_cart is not None else []
+                capped += request.anonymous_cart.persist(user, cart_id or '')
+            except Exception:
+                # Each merge step is atomic; a failed one must not block the login.
+                logger.exception('Could not merge the cart of user %s at login', user.pk)
+                merged, capped = False, []
+                messages.warning(request, 'We could not add your previous cart items to your cart.')
+            for product in capped:
+                messages.warning(request, f'{product.product_name}: Maximum stock limit reached.')
+            if merged:
+                messages.info(request, 'Your cart has been updated with previous items.')
+            else:
+                user_cart = Cart.objects.active_for(user)
+                cart_count = user_cart.get_total_items() if user_cart else 0
+                if cart_count > 0:
+                    messages.info(request, f'Welcome back! You have {cart_count} item(s) in your cart.')
+
             auth.login(request, user)
             messages.success(request, 'You are now logged in.')
             return redirect('dashboard')
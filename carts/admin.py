@@ -12,19 +12,26 @@ class CartItemInline(admin.TabularInline):
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ('id', 'cart_id', 'user', 'get_total_items', 'is_active', 'date_added', 'updated_at')
+    list_display = ('id', 'cart_id', 'user', 'get_total_items', 'get_cart_total', 'is_active', 'date_added', 'updated_at')
+    list_select_related = ('user',)
     list_filter = ('is_active', 'date_added', 'updated_at')
     search_fields = ('cart_id', 'user__email', 'user__username')
     readonly_fields = ('date_added', 'updated_at', 'get_total_items', 'get_cart_total')
     inlines = [CartItemInline]
+
+    def get_queryset(self, request):
+        # Totals come from one GROUP BY instead of a query per row.
+        return super().get_queryset(request).with_totals()
     
     def get_total_items(self, obj):
-        return obj.get_total_items()
+        return obj.total_items
     get_total_items.short_description = 'Total Items'
+    get_total_items.admin_order_field = 'total_items'
     
     def get_cart_total(self, obj):
-        return f"${obj.get_cart_total():.2f}"
+        return f"${obj.cart_total:.2f}"
     get_cart_total.short_description = 'Cart Total'
+    get_cart_total.admin_order_field = 'cart_total'
 
 
 @admin.register(CartItem)
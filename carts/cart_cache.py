@@ -0,0 +1,70 @@
+"""
+Cached summary of a visitor's cart for the navbar badge and page validators.
+
+The summary (item count plus a fingerprint of the active items) is stored
+per user and computed with a single aggregate query on a miss. CartItem
+signals drop it after every change; code that changes cart items with
+QuerySet.update() or bulk methods must call invalidate_user() itself.
+The fingerprint feeds the catalog ETags (store.conditional), so the entry
+must live in a cache every process shares (settings.CACHES); otherwise
+other processes would keep serving, and 304-validating, a stale count.
+Anonymous carts aren't in the database: their summary comes straight from
+request.anonymous_cart (see carts.storage).
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from .models import CartItem
+
+logger = logging.getLogger(__name__)
+
+EMPTY = {'count': 0, 'fingerprint': ''}
+
+
+def _user_key(user_id):
+    return 'cart_summary:user:%s' % user_id
+
+
+def _summarize(items):
+    state = items.aggregate(lines=Count('id'), quantity=Sum('quantity'), updated=Max('updated_at'))
+    if not state['lines']:
+        return EMPTY
+    return {
+        'count': state['quantity'],
+        'fingerprint': '%d:%d:%s' % (state['lines'], state['quantity'], state['updated'].isoformat()),
+    }
+
+
+def _cached(key, items):
+    summary = cache.get(key)
+    if summary is None:
+        summary = _summarize(items)
+        cache.set(key, summary, settings.CART_SUMMARY_TIMEOUT)
+    return summary
+
+
+def get_summary(request):
+    """{'count': ..., 'fingerprint': ...} of the request's active cart items"""
+    if request.user.is_authenticated:
+        return _cached(_user_key(request.user.pk), CartItem.objects.filter(user=request.user, is_active=True))
+    storage = getattr(request, 'anonymous_cart', None)
+    return storage.summary() if storage is not None else EMPTY
+
+
+def _delete(key):
+    # Runs after the cart change has committed: a cache outage (or a locked
+    # database cache) must not turn it into an error. The entry then expires
+    # after CART_SUMMARY_TIMEOUT.
+    try:
+        cache.delete(key)
+    except Exception as e:
+        logger.error('Cart summary invalidation failed for %s: %s', key, e)
+
+
+def invalidate_user(user_id):
+    if user_id is not None:
+        transaction.on_commit(lambda: _delete(_user_key(user_id)))
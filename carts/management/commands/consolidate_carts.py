@@ -1,57 +1,106 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from carts import cart_cache
 from carts.models import Cart, CartItem
-from django.db.models import Count
+
 
 class Command(BaseCommand):
-    help = 'Consolidate duplicate carts for each user'
+    help = 'Consolidate duplicate active carts for each user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of users merged per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be merged without changing anything')
 
     def handle(self, *args, **options):
-        self.stdout.write('Starting cart consolidation...')
-        
-        # Find users with multiple active carts
-        users_with_duplicates = Cart.objects.filter(is_active=True).values('user').annotate(
-            cart_count=Count('id')
-        ).filter(cart_count__gt=1)
-        
-        consolidated = 0
-        for user_data in users_with_duplicates:
-            user_id = user_data['user']
-            if user_id is None:
-                continue
-                
-            # Get all carts for this user, ordered by most recent
-            user_carts = Cart.objects.filter(user_id=user_id, is_active=True).order_by('-updated_at')
-            
-            # Keep the most recent cart
-            main_cart = user_carts.first()
-            duplicate_carts = user_carts[1:]
-            
-            # Move all items from duplicate carts to main cart
-            for dup_cart in duplicate_carts:
-                dup_items = CartItem.objects.filter(cart=dup_cart)
-                items_moved = 0
-                
-                for dup_item in dup_items:
-                    try:
-                        # Check if item already exists in main cart
-                        existing_item = CartItem.objects.get(
-                            cart=main_cart,
-                            product=dup_item.product,
-                            user_id=user_id
-                        )
-                        # Merge quantities
-                        existing_item.quantity += dup_item.quantity
-                        existing_item.save()
-                        dup_item.delete()
-                        items_moved += 1
-                    except CartItem.DoesNotExist:
-                        # Move item to main cart
-                        dup_item.cart = main_cart
-                        dup_item.save()
-                        items_moved += 1
-                        
-                self.stdout.write(f'  Moved {items_moved} items from cart {dup_cart.id} to {main_cart.id}')
-                dup_cart.delete()
-                consolidated += 1
-        
-        self.stdout.write(self.style.SUCCESS(f'Successfully consolidated {consolidated} duplicate carts'))
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        dry_run = options['dry_run']
+        self.stdout.write('Starting cart consolidation%s...' % (' (dry run)' if dry_run else ''))
+
+        started = time.monotonic()
+        users = carts = items = 0
+        last_user_id = 0
+        while True:
+            user_ids = list(
+                Cart.objects.filter(is_active=True, user_id__gt=last_user_id)
+                .values('user_id').annotate(carts=Count('id')).filter(carts__gt=1)
+                .order_by('user_id').values_list('user_id', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            last_user_id = user_ids[-1]
+            with transaction.atomic():
+                merged_carts, merged_items = self.merge(user_ids, dry_run)
+                if dry_run:
+                    transaction.set_rollback(True)
+            users += len(user_ids)
+            carts += merged_carts
+            items += merged_items
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  {users} users, {carts} carts ({users / max(elapsed, 0.001):.0f} users/sec)')
+
+        elapsed = time.monotonic() - started
+        verb = 'Would consolidate' if dry_run else 'Successfully consolidated'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {carts} duplicate carts of {users} users ({items} items merged) in {elapsed:.1f}s'
+        ))
+
+    def merge(self, user_ids, dry_run=False):
+        """
+        Fold every extra active cart of `user_ids` into the user's latest one.
+
+        Returns (duplicate carts removed, items removed by merging). Item
+        quantities are summed per (user, product) with one GROUP BY; the
+        surviving rows are written with one bulk_update and the rest go in
+        one DELETE per table.
+        """
+        main_cart_ids = {}
+        duplicate_cart_ids = []
+        for cart_id, user_id in (Cart.objects.select_for_update()
+                                 .filter(user_id__in=user_ids, is_active=True)
+                                 .order_by('user_id', '-updated_at', '-id')
+                                 .values_list('id', 'user_id')):
+            if user_id in main_cart_ids:
+                duplicate_cart_ids.append(cart_id)
+            else:
+                main_cart_ids[user_id] = cart_id
+
+        groups = (CartItem.objects
+                  .filter(cart__user_id__in=user_ids, cart__is_active=True)
+                  .values('cart__user_id', 'product_id', 'user_id')
+                  .annotate(
+                      total=Sum('quantity'),
+                      lines=Count('id'),
+                      main_item=Max('id', filter=Q(cart_id__in=main_cart_ids.values())),
+                      any_item=Max('id'),
+                  )
+                  .order_by())
+
+        now = timezone.now()
+        survivors = []
+        merged = 0
+        for group in groups:
+            item_id = group['main_item'] or group['any_item']
+            survivors.append(CartItem(
+                pk=item_id,
+                cart_id=main_cart_ids[group['cart__user_id']],
+                quantity=group['total'],
+                updated_at=now,
+            ))
+            merged += group['lines'] - 1
+
+        if not dry_run:
+            CartItem.objects.bulk_update(survivors, ['cart', 'quantity', 'updated_at'], batch_size=500)
+            CartItem.objects.filter(cart_id__in=duplicate_cart_ids).delete()
+            Cart.objects.filter(pk__in=duplicate_cart_ids).delete()
+            for user_id in user_ids:
+                cart_cache.invalidate_user(user_id)
+        return len(duplicate_cart_ids), merged
@@ -0,0 +1,86 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from carts.models import Cart, CartItem
+
+
+DB_SESSION_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned carts, inactive cart items and expired sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CART_PURGE_AFTER_DAYS,
+                            help='Purge anonymous and inactive carts and inactive items untouched for this many days')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows selected per DELETE')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches, to leave room for live traffic')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count what would be purged without deleting anything')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        if self.batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        self.sleep = options['sleep']
+        self.dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write('Purging carts untouched since %s%s...' % (
+            cutoff.strftime('%Y-%m-%d %H:%M'), ' (dry run)' if self.dry_run else ''))
+
+        started = time.monotonic()
+        total = 0
+        total += self.purge('carts', Cart.objects.filter(
+            Q(user__isnull=True) | Q(is_active=False), updated_at__lt=cutoff,
+        ))
+        total += self.purge('inactive cart items', CartItem.objects.filter(is_active=False, updated_at__lt=cutoff))
+        if settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+            total += self.purge('expired sessions', Session.objects.filter(expire_date__lt=timezone.now()))
+
+        elapsed = time.monotonic() - started
+        verb = 'Would purge' if self.dry_run else 'Successfully purged'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total} rows in {elapsed:.1f}s ({total / max(elapsed, 0.001):.0f} rows/sec)'
+        ))
+
+    def purge(self, label, queryset):
+        """
+        Delete the rows of `queryset` one primary-key range at a time.
+
+        Each batch reads the next `batch_size` matching keys, then deletes
+        the range they span with the filter applied again, so a row touched
+        by a live request in the meantime is kept. Every DELETE is its own
+        short transaction. Returns the number of rows deleted, including
+        cascaded cart items.
+        """
+        started = time.monotonic()
+        deleted = 0
+        last_pk = None
+        while True:
+            batch = queryset.order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pks = list(batch.values_list('pk', flat=True)[:self.batch_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            window = queryset.filter(pk__gte=pks[0], pk__lte=last_pk)
+            if self.dry_run:
+                deleted += window.count()
+            else:
+                deleted += window.delete()[0]
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  {label}: {deleted} rows ({deleted / max(elapsed, 0.001):.0f} rows/sec)')
+            if self.sleep:
+                time.sleep(self.sleep)
+        return deleted
@@ -0,0 +1,23 @@
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .storage import default_storage
+
+
+class AnonymousCartMiddleware(MiddlewareMixin):
+    """
+    Attach the anonymous cart storage to the request as request.anonymous_cart.
+    """
+
+    def process_request(self, request):
+        request.anonymous_cart = default_storage(request)
+
+    def process_response(self, request, response):
+        """Save the cart if it changed; pages that read it vary on the cart cookie"""
+        # A higher middleware layer may return a response before process_request ran.
+        storage = getattr(request, 'anonymous_cart', None)
+        if storage is not None:
+            if storage.accessed:
+                patch_vary_headers(response, ('Cookie',))
+            storage.update(response)
+        return response
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Fold every user's extra active carts into their most recently updated one"""
+    Cart = apps.get_model('carts', 'Cart')
+    CartItem = apps.get_model('carts', 'CartItem')
+
+    user_ids = (Cart.objects.filter(is_active=True, user__isnull=False)
+                .values('user').annotate(carts=Count('id')).filter(carts__gt=1).order_by()
+                .values_list('user', flat=True))
+    for user_id in list(user_ids):
+        carts = list(Cart.objects.filter(user_id=user_id, is_active=True).order_by('-updated_at', '-id'))
+        main, duplicates = carts[0], carts[1:]
+        kept = {(item.product_id, item.user_id): item for item in CartItem.objects.filter(cart=main)}
+        for item in CartItem.objects.filter(cart__in=duplicates).order_by('id'):
+            existing = kept.get((item.product_id, item.user_id))
+            if existing is not None:
+                existing.quantity += item.quantity
+                existing.save(update_fields=['quantity'])
+                item.delete()
+            else:
+                item.cart = main
+                item.save(update_fields=['cart'])
+                kept[(item.product_id, item.user_id)] = item
+        Cart.objects.filter(pk__in=[cart.pk for cart in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0002_auto_20260131_2223'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+    ]
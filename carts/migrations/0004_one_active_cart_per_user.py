@@ -0,0 +1,17 @@
+# Generated by Django 3.1 on 2026-10-17 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0003_merge_duplicate_carts'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(is_active=True), fields=('user',), name='carts_one_active_cart_per_user'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1 on 2026-10-17 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0004_one_active_cart_per_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['updated_at'], name='carts_cart_updated_c06937_idx'),
+        ),
+    ]
@@ -1,9 +1,44 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from store.models import Product, Variation
 from django.core.validators import MinValueValidator
 
 # Create your models here.
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate total_items and cart_total of each cart's active items"""
+        active = Q(cartitem__is_active=True)
+        return self.annotate(
+            total_items=Coalesce(Sum('cartitem__quantity', filter=active), 0),
+            cart_total=Coalesce(
+                Sum(F('cartitem__quantity') * F('cartitem__product__price'), filter=active, output_field=MONEY),
+                Value(0, output_field=MONEY),
+            ),
+        )
+
+
+class CartManager(models.Manager.from_queryset(CartQuerySet)):
+    def active_for(self, user):
+        """The user's active cart, or None; the database guarantees there is at most one"""
+        return self.filter(user=user, is_active=True).first()
+
+    def get_or_create_active(self, user, cart_id=''):
+        cart = self.active_for(user)
+        if cart is None:
+            try:
+                with transaction.atomic():
+                    cart = self.create(user=user, cart_id=cart_id or '', is_active=True)
+            except IntegrityError:
+                # Created by a concurrent request.
+                cart = self.get(user=user, is_active=True)
+        return cart
+
+
 class Cart(models.Model):
     cart_id = models.CharField(max_length=250, blank=True, db_index=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
@@ -11,10 +46,21 @@ class Cart(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
 
+    objects = CartManager()
+
     class Meta:
         ordering = ['-updated_at']
         verbose_name = 'Cart'
         verbose_name_plural = 'Carts'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(is_active=True), name='carts_one_active_cart_per_user',
+            ),
+        ]
+        indexes = [
+            # purge_carts selects abandoned carts by age.
+            models.Index(fields=['updated_at']),
+        ]
 
     def __str__(self):
         if self.user:
@@ -23,11 +69,14 @@ class Cart(models.Model):
     
     def get_total_items(self):
         """Get total number of items in cart"""
-        return sum(item.quantity for item in self.cartitem_set.filter(is_active=True))
+        return self.cartitem_set.filter(is_active=True).aggregate(total=Sum('quantity'))['total'] or 0
     
     def get_cart_total(self):
         """Get total price of all items in cart"""
-        return sum(item.sub_total() for item in self.cartitem_set.filter(is_active=True))
+        total = self.cartitem_set.filter(is_active=True).aggregate(
+            total=Sum(F('quantity') * F('product__price'), output_field=MONEY),
+        )['total']
+        return total or 0
     
 
 class CartItem(models.Model):
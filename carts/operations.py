@@ -0,0 +1,223 @@
+"""
+Atomic cart item mutations.
+
+Quantities are changed with single conditional UPDATE statements, so two
+concurrent clicks can neither lose an update nor push a line past the
+product's stock: the cap is part of the WHERE clause. A line that doesn't
+exist yet is inserted inside a savepoint; losing that race to another
+request raises IntegrityError, after which the UPDATE is simply retried.
+
+These bypass CartItem.save() and its signals, so they invalidate the
+cached cart summary themselves.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+
+from store.models import Product
+from . import cart_cache
+from .models import Cart, CartItem
+
+
+def _stock(product_id):
+    return Subquery(Product.objects.filter(pk=product_id).values('stock')[:1])
+
+
+def _invalidate(user):
+    cart_cache.invalidate_user(user.pk if user is not None else None)
+
+
+def _increment(cart, product, user, quantity):
+    return CartItem.objects.filter(
+        cart=cart, product=product, user=user, quantity__lte=_stock(product.pk) - quantity,
+    ).update(
+        quantity=F('quantity') + quantity,
+        is_active=True,
+        is_available=True,
+        stock_status=CartItem.AVAILABLE,
+        updated_at=timezone.now(),
+    )
+
+
+def add_item(cart, product, user=None, quantity=1):
+    """
+    Add `quantity` of `product` to the cart; returns False if that would exceed its stock.
+
+    One UPDATE when the line exists, otherwise one INSERT in a savepoint.
+    """
+    with transaction.atomic():
+        added = _increment(cart, product, user, quantity) > 0
+        if not added and product.stock >= quantity:
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(cart=cart, product=product, user=user, quantity=quantity)
+                added = True
+            except IntegrityError:
+                # The line exists (at its cap) or was just inserted by a concurrent request.
+                added = _increment(cart, product, user, quantity) > 0
+        if added:
+            _invalidate(user)
+    return added
+
+
+def remove_item(cart, product, user=None):
+    """Take one unit of `product` out of the cart, deleting the line at its last unit"""
+    with transaction.atomic():
+        decremented = CartItem.objects.filter(
+            cart=cart, product=product, user=user, quantity__gt=1,
+        ).update(quantity=F('quantity') - 1, updated_at=timezone.now())
+        if decremented:
+            _invalidate(user)
+        else:
+            # Deleting sends the CartItem signals, which invalidate the summary.
+            CartItem.objects.filter(cart=cart, product=product, user=user).delete()
+
+
+def set_quantity(cart, product, user=None, quantity=1):
+    """
+    Set the line to `quantity`, capped at the product's stock.
+
+    Returns the quantity now in the cart; 0 removes the line.
+    """
+    quantity = min(quantity, product.stock)
+    if quantity <= 0:
+        delete_item(cart, product, user)
+        return 0
+    values = {
+        'quantity': quantity,
+        'is_active': True,
+        'is_available': True,
+        'stock_status': CartItem.AVAILABLE,
+        'updated_at': timezone.now(),
+    }
+    lines = CartItem.objects.filter(cart=cart, product=product, user=user)
+    with transaction.atomic():
+        if not lines.update(**values):
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(cart=cart, product=product, user=user, quantity=quantity)
+            except IntegrityError:
+                # Inserted by a concurrent request.
+                lines.update(**values)
+        _invalidate(user)
+    return quantity
+
+
+def delete_item(cart, product, user=None):
+    """Remove the whole line; returns True if there was one"""
+    deleted, _ = CartItem.objects.filter(cart=cart, product=product, user=user).delete()
+    return deleted > 0
+
+
+MERGED_FIELDS = ['cart', 'user', 'quantity', 'is_active', 'is_available', 'stock_status', 'updated_at']
+
+
+def _merge_quantity(item, wanted, now, capped):
+    """Set the merged quantity of `item`, capped at stock; capped products are appended to `capped`"""
+    product = item.product
+    if wanted > product.stock:
+        capped.append(product)
+    # An out-of-stock line keeps one unit; the cart page shows it as unavailable.
+    item.quantity = max(min(wanted, product.stock), 1)
+    item.is_active = True
+    item.updated_at = now
+    item.check_stock_availability()
+
+
+def add_lines(user, quantities, cart_id=''):
+    """
+    Add {product_id: quantity} to `user`'s active cart in one bulk write.
+
+    Quantities are added to existing lines and capped at the product's
+    stock; out-of-stock and deleted products are skipped. Returns the
+    products that didn't get the full quantity.
+    """
+    with transaction.atomic():
+        cart = Cart.objects.get_or_create_active(user, cart_id)
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.select_related('product')
+            .filter(cart=cart, user=user, product_id__in=list(quantities))
+        }
+        products = Product.objects.in_bulk([pk for pk in quantities if pk not in existing])
+        now = timezone.now()
+        changed, created, capped = [], [], []
+        for product_id, quantity in quantities.items():
+            item = existing.get(product_id)
+            product = item.product if item is not None else products.get(product_id)
+            if product is None:
+                continue
+            if item is not None:
+                _merge_quantity(item, item.quantity + quantity, now, capped)
+                changed.append(item)
+            elif product.stock > 0:
+                item = CartItem(
+                    cart=cart, product=product, user=user, quantity=quantity,
+                    price_at_addition=product.price, stock_at_addition=product.stock,
+                )
+                _merge_quantity(item, quantity, now, capped)
+                created.append(item)
+            else:
+                capped.append(product)
+        CartItem.objects.bulk_update(changed, MERGED_FIELDS, batch_size=500)
+        # bulk_create() skips CartItem.save() and its signals. A line inserted by a
+        # concurrent request in the meantime is kept as it is.
+        CartItem.objects.bulk_create(created, batch_size=500, ignore_conflicts=True)
+        cart_cache.invalidate_user(user.pk)
+    return capped
+
+
+def merge_cart(source, user):
+    """
+    Move the lines of the anonymous cart `source` into `user`'s active cart.
+
+    Runs a fixed number of queries whatever the cart size: the items of
+    both carts are loaded with their products in one query, the summed
+    quantities are capped at stock in memory, and the result is written
+    with one bulk_update before `source` and its leftover lines are
+    deleted. Lines the user doesn't have yet are moved, keeping their
+    variations; several lines of one product (older session carts could
+    hold duplicates) are folded into one. When the user has no active
+    cart, `source` becomes it. Returns the products whose quantity was
+    capped.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        cart = Cart.objects.active_for(user)
+        adopted = cart is None
+        if adopted:
+            Cart.objects.filter(pk=source.pk).update(user=user, is_active=True, updated_at=now)
+            cart = source
+
+        own, incoming = {}, []
+        for item in (CartItem.objects.select_related('product')
+                     .filter(Q(cart=source) | Q(cart=cart, user=user)).order_by('pk')):
+            if item.cart_id == cart.pk and item.user_id == user.pk:
+                own[item.product_id] = item
+            else:
+                incoming.append(item)
+
+        changed, folded, capped = {}, [], {}
+        for item in incoming:
+            target = own.get(item.product_id)
+            if target is None:
+                item.cart = cart
+                item.user = user
+                own[item.product_id] = target = item
+                quantity = item.quantity
+            else:
+                quantity = target.quantity + item.quantity
+                folded.append(item.pk)
+            merged_capped = []
+            _merge_quantity(target, quantity, now, merged_capped)
+            capped.update((product.pk, product) for product in merged_capped)
+            changed[target.pk] = target
+
+        # Folded lines go first: in an adopted cart they would clash with the lines they were added to.
+        if folded:
+            CartItem.objects.filter(pk__in=folded).delete()
+        CartItem.objects.bulk_update(list(changed.values()), MERGED_FIELDS, batch_size=500)
+        if not adopted:
+            Cart.objects.filter(pk=source.pk).delete()
+        _invalidate(user)
+    return list(capped.values())
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cart_cache
+from .models import Cart, CartItem
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cart_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    cart_cache.invalidate_user(instance.user_id)
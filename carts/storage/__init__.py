@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def default_storage(request):
+    """
+    The anonymous cart storage configured by settings.CART_STORAGE.
+
+    Like django.contrib.messages, the setting is read per call rather than
+    at import time.
+    """
+    return import_string(settings.CART_STORAGE)(request)
@@ -0,0 +1,149 @@
+"""
+Anonymous carts kept outside the database.
+
+A visitor who isn't logged in has their cart stored as {product_id:
+quantity} by one of the backends here (a signed cookie or the cache), so
+browsing and changing an anonymous cart writes no Cart or CartItem rows.
+AnonymousCartMiddleware attaches the storage to the request as
+request.anonymous_cart and saves it once per response, only if it
+changed. At login, persist() moves the lines into the user's cart.
+"""
+from carts import operations
+from carts.models import CartItem
+
+
+class CartLine:
+    """A stored line joined with its product, shaped like a CartItem for the cart page"""
+    OUT_OF_STOCK = CartItem.OUT_OF_STOCK
+    INSUFFICIENT_STOCK = CartItem.INSUFFICIENT_STOCK
+    AVAILABLE = CartItem.AVAILABLE
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        self.stock_status = CartItem.AVAILABLE
+        self.is_available = True
+        self.is_active = True
+
+    sub_total = CartItem.sub_total
+    check_stock_availability = CartItem.check_stock_availability
+    get_stock_message = CartItem.get_stock_message
+
+    def get_variations_display(self):
+        return ''
+
+
+class BaseCartStorage:
+    """
+    Base class of the anonymous cart backends.
+
+    Subclasses implement _load(), returning the stored mapping or None,
+    and _store(response), which saves self.items (or drops an empty cart).
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.modified = False
+        self._items = None
+
+    @property
+    def accessed(self):
+        return self._items is not None
+
+    @property
+    def items(self):
+        if self._items is None:
+            self._items = self._clean(self._load())
+        return self._items
+
+    @staticmethod
+    def _clean(data):
+        """Stored mapping with int keys and positive quantities; anything malformed is an empty cart"""
+        try:
+            items = {int(product_id): int(quantity) for product_id, quantity in (data or {}).items()}
+        except (AttributeError, TypeError, ValueError):
+            return {}
+        return {product_id: quantity for product_id, quantity in items.items() if quantity > 0}
+
+    def _load(self):
+        raise NotImplementedError('subclasses of BaseCartStorage must provide a _load() method')
+
+    def _store(self, response):
+        raise NotImplementedError('subclasses of BaseCartStorage must provide a _store() method')
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, product_id):
+        return product_id in self.items
+
+    def count(self):
+        return sum(self.items.values())
+
+    def summary(self):
+        """Same shape as carts.cart_cache.get_summary(), without touching the database"""
+        if not self.items:
+            return {'count': 0, 'fingerprint': ''}
+        return {
+            'count': self.count(),
+            'fingerprint': 'anon:' + ','.join('%d:%d' % line for line in sorted(self.items.items())),
+        }
+
+    def add(self, product, quantity=1):
+        """Add `quantity` of `product`; returns False if that would exceed its stock"""
+        new_quantity = self.items.get(product.pk, 0) + quantity
+        if new_quantity > product.stock:
+            return False
+        self.set(product.pk, new_quantity)
+        return True
+
+    def set(self, product_id, quantity):
+        """Store `quantity` of the product, removing the line when it drops to zero"""
+        if quantity > 0:
+            if self.items.get(product_id) == quantity:
+                return
+            self.items[product_id] = quantity
+        elif self.items.pop(product_id, None) is None:
+            return
+        self.modified = True
+
+    def remove(self, product_id):
+        """Take one unit of the product out of the cart"""
+        self.set(product_id, self.items.get(product_id, 0) - 1)
+
+    def delete(self, product_id):
+        """Remove the whole line; returns True if there was one"""
+        had_line = product_id in self.items
+        self.set(product_id, 0)
+        return had_line
+
+    def clear(self):
+        if self.items:
+            self._items = {}
+            self.modified = True
+
+    def lines(self):
+        """CartLine objects for the stored products that still exist, newest product first"""
+        from store.models import Product
+
+        products = Product.objects.select_related('category').in_bulk(list(self.items))
+        for product_id in [product_id for product_id in self.items if product_id not in products]:
+            self.set(product_id, 0)
+        return [CartLine(products[product_id], quantity) for product_id, quantity in reversed(self.items.items())]
+
+    def persist(self, user, cart_id=''):
+        """
+        Write the stored lines into `user`'s active cart and empty the storage.
+
+        Returns the products whose quantity was capped at their stock.
+        """
+        if not self.items:
+            return []
+        capped = operations.add_lines(user, self.items, cart_id)
+        self.clear()
+        return capped
+
+    def update(self, response):
+        """Save the cart on `response` if it changed during the request"""
+        if self.modified:
+            self._store(response)
@@ -0,0 +1,47 @@
+import re
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .base import BaseCartStorage
+
+
+TOKEN_RE = re.compile(r'[A-Za-z0-9_-]{16,64}')
+
+
+class CacheCartStorage(BaseCartStorage):
+    """
+    Keep the anonymous cart in the cache, under a random token sent as a cookie.
+
+    The cache must be shared by every process serving the site (e.g.
+    memcached or Redis, not the per-process local memory cache).
+    """
+
+    def __init__(self, request):
+        super().__init__(request)
+        token = request.COOKIES.get(settings.CART_COOKIE_NAME, '')
+        self.token = token if TOKEN_RE.fullmatch(token) else None
+
+    def _key(self):
+        return 'anonymous_cart:%s' % self.token
+
+    def _load(self):
+        return cache.get(self._key()) if self.token else None
+
+    def _store(self, response):
+        if self.items:
+            if self.token is None:
+                self.token = secrets.token_urlsafe(24)
+            cache.set(self._key(), self.items, settings.CART_COOKIE_AGE)
+            response.set_cookie(
+                settings.CART_COOKIE_NAME,
+                self.token,
+                max_age=settings.CART_COOKIE_AGE,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        elif self.token is not None:
+            cache.delete(self._key())
+            response.delete_cookie(settings.CART_COOKIE_NAME, samesite='Lax')
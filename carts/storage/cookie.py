@@ -0,0 +1,40 @@
+import json
+
+from django.conf import settings
+
+from .base import BaseCartStorage
+
+
+class CookieCartStorage(BaseCartStorage):
+    """
+    Keep the anonymous cart in a signed cookie.
+
+    Needs no server-side state, so it works with any cache backend and any
+    number of processes; a cart is limited to what fits in one cookie.
+    """
+    salt = 'carts.storage.cookie'
+
+    def _load(self):
+        data = self.request.get_signed_cookie(
+            settings.CART_COOKIE_NAME, None, salt=self.salt, max_age=settings.CART_COOKIE_AGE,
+        )
+        if not data:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def _store(self, response):
+        if self.items:
+            response.set_signed_cookie(
+                settings.CART_COOKIE_NAME,
+                json.dumps(self.items, separators=(',', ':')),
+                salt=self.salt,
+                max_age=settings.CART_COOKIE_AGE,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        else:
+            response.delete_cookie(settings.CART_COOKIE_NAME, samesite='Lax')
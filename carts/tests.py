@@ -1,3 +1,223 @@
-from django.test import TestCase
+import json
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from accounts.models import Account
+from category.models import Category
+from store.models import Product
+from .models import Cart, CartItem
+from .operations import add_item, merge_cart, remove_item
+
+
+def make_product(stock):
+    category = Category.objects.create(category_name='Shirts', slug='shirts')
+    return Product.objects.create(
+        product_name='Shirt', slug='shirt', price=10, stock=stock, category=category,
+        images='photos/products/shirt.jpg',
+    )
+
+
+def make_user(email='buyer@example.com'):
+    return Account.objects.create_user(
+        first_name='Test', last_name='Buyer', username=email.split('@')[0], email=email, password='secret',
+    )
+
+
+class CartOperationsTests(TestCase):
+
+    def setUp(self):
+        self.product = make_product(stock=3)
+        self.user = make_user()
+        self.cart = Cart.objects.create(cart_id='cart', user=self.user)
+
+    def quantity(self):
+        return CartItem.objects.get(cart=self.cart, product=self.product).quantity
+
+    def test_add_creates_then_increments(self):
+        self.assertTrue(add_item(self.cart, self.product, self.user))
+        self.assertTrue(add_item(self.cart, self.product, self.user))
+        self.assertEqual(self.quantity(), 2)
+
+    def test_add_stops_at_stock(self):
+        for _ in range(3):
+            self.assertTrue(add_item(self.cart, self.product, self.user))
+        self.assertFalse(add_item(self.cart, self.product, self.user))
+        self.assertEqual(self.quantity(), 3)
+
+    def test_add_out_of_stock_product(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=0)
+        self.product.refresh_from_db()
+        self.assertFalse(add_item(self.cart, self.product, self.user))
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_add_is_a_single_update_for_an_existing_line(self):
+        add_item(self.cart, self.product, self.user)
+        with self.assertNumQueries(3):  # savepoint, UPDATE, release
+            add_item(self.cart, self.product, self.user)
+
+    def test_remove_decrements_then_deletes(self):
+        add_item(self.cart, self.product, self.user, quantity=2)
+        remove_item(self.cart, self.product, self.user)
+        self.assertEqual(self.quantity(), 1)
+        remove_item(self.cart, self.product, self.user)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class ActiveCartTests(TestCase):
+
+    def test_one_active_cart_per_user(self):
+        user = make_user()
+        cart = Cart.objects.get_or_create_active(user, 'first')
+        self.assertEqual(Cart.objects.get_or_create_active(user, 'second'), cart)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=user, cart_id='third')
+        # Inactive and anonymous carts are not limited.
+        Cart.objects.create(user=user, cart_id='old', is_active=False)
+        Cart.objects.create(cart_id='anonymous-1')
+        Cart.objects.create(cart_id='anonymous-2')
+
+
+class MergeCartTests(TestCase):
+
+    def test_merge_sums_caps_and_moves_lines(self):
+        shirt = make_product(stock=3)
+        hat = Product.objects.create(
+            product_name='Hat', slug='hat', price=5, stock=10, category=shirt.category,
+            images='photos/products/hat.jpg',
+        )
+        user = make_user()
+        cart = Cart.objects.create(cart_id='user', user=user)
+        CartItem.objects.create(cart=cart, user=user, product=shirt, quantity=2)
+        session_cart = Cart.objects.create(cart_id='session')
+        CartItem.objects.create(cart=session_cart, product=shirt, quantity=2)
+        moved = CartItem.objects.create(cart=session_cart, product=hat, quantity=4)
+
+        self.assertEqual(merge_cart(session_cart, user), [shirt])
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart=cart, user=user).values_list('product', 'quantity')),
+            {shirt.pk: 3, hat.pk: 4},
+        )
+        self.assertEqual(CartItem.objects.get(product=hat).pk, moved.pk)
+        self.assertFalse(Cart.objects.filter(pk=session_cart.pk).exists())
+
+    def test_duplicate_session_lines_are_folded(self):
+        shirt = make_product(stock=5)
+        user = make_user()
+        cart = Cart.objects.create(cart_id='user', user=user)
+        session_cart = Cart.objects.create(cart_id='session')
+        CartItem.objects.create(cart=session_cart, product=shirt, quantity=2)
+        CartItem.objects.create(cart=session_cart, product=shirt, quantity=2)
+
+        self.assertEqual(merge_cart(session_cart, user), [])
+        self.assertEqual(list(CartItem.objects.filter(cart=cart, user=user).values_list('quantity', flat=True)), [4])
+
+    def test_adopted_cart_folds_duplicates_and_caps(self):
+        shirt = make_product(stock=3)
+        user = make_user()
+        session_cart = Cart.objects.create(cart_id='session')
+        CartItem.objects.create(cart=session_cart, product=shirt, quantity=2)
+        CartItem.objects.create(cart=session_cart, product=shirt, quantity=2)
+
+        self.assertEqual(merge_cart(session_cart, user), [shirt])
+        self.assertEqual(Cart.objects.active_for(user).pk, session_cart.pk)
+        self.assertEqual(list(CartItem.objects.values_list('user', 'quantity')), [(user.pk, 3)])
+
+    def test_failed_merge_does_not_block_login(self):
+        user = make_user()
+        product = make_product(stock=2)
+        self.client.get(reverse('add_cart', args=[product.pk]))
+        with mock.patch('carts.operations.add_lines', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('accounts.views', 'ERROR'):
+            response = self.client.post(reverse('login'), {'email': user.email, 'password': 'secret'})
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+
+
+class AnonymousCartTests(TestCase):
+
+    def setUp(self):
+        self.product = make_product(stock=2)
+
+    def test_anonymous_cart_stays_out_of_the_database(self):
+        for _ in range(3):
+            self.client.get(reverse('add_cart', args=[self.product.pk]))
+        self.assertFalse(Cart.objects.exists())
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['quantity'], 2)
+
+    def test_login_persists_the_anonymous_cart(self):
+        user = make_user()
+        self.client.get(reverse('add_cart', args=[self.product.pk]))
+        self.client.post(reverse('login'), {'email': user.email, 'password': 'secret'})
+        item = CartItem.objects.get(user=user, product=self.product)
+        self.assertEqual((item.quantity, item.cart.user), (1, user))
+        self.assertEqual(self.client.cookies[settings.CART_COOKIE_NAME].value, '')
+
+
+class CartApiTests(TestCase):
+
+    def test_batch_applies_all_changes_and_returns_totals(self):
+        shirt = make_product(stock=2)
+        hat = Product.objects.create(
+            product_name='Hat', slug='hat', price=5, stock=10, category=shirt.category,
+            images='photos/products/hat.jpg',
+        )
+        user = make_user()
+        self.client.force_login(user)
+        response = self.client.post(reverse('cart_api_batch'), json.dumps({'changes': [
+            {'product': shirt.pk, 'quantity': 5},
+            {'product': hat.pk, 'action': 'add', 'quantity': 3},
+        ]}), content_type='application/json')
+        data = response.json()
+        self.assertEqual([line['quantity'] for line in data['lines']], [2, 3])
+        self.assertIn('message', data['lines'][0])
+        self.assertEqual(data['summary']['count'], 5)
+        self.assertEqual(data['summary']['total'], '35.00')
+        self.assertEqual(CartItem.objects.filter(user=user).count(), 2)
+
+    def test_unknown_product_changes_nothing(self):
+        product = make_product(stock=2)
+        response = self.client.post(reverse('cart_api_batch'), json.dumps({'changes': [
+            {'product': product.pk, 'quantity': 1}, {'product': product.pk + 1, 'quantity': 1},
+        ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse('cart')).context['quantity'], 0)
+
+
+class ConcurrentAddTests(TransactionTestCase):
+
+    def test_concurrent_adds_never_exceed_stock(self):
+        product = make_product(stock=5)
+        user = make_user()
+        cart = Cart.objects.create(cart_id='cart', user=user)
+        results = []
+        barrier = threading.Barrier(8)
+
+        def click():
+            barrier.wait()
+            try:
+                for _ in range(3):
+                    while True:
+                        try:
+                            results.append(add_item(cart, product, user))
+                            break
+                        except OperationalError:
+                            # SQLite reports a locked database instead of waiting.
+                            continue
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(CartItem.objects.get(cart=cart, product=product).quantity, 5)
+        self.assertEqual(CartItem.objects.filter(cart=cart, product=product).count(), 1)
@@ -6,4 +6,8 @@ urlpatterns = [
     path('remove_cart/<int:product_id>/', views.remove_cart, name='remove_cart'),
     path('remove_cart_item/<int:product_id>/', views.remove_cart_item, name='remove_cart_item'),
     path('checkout/', views.checkout, name='checkout'),
+    path('api/lines/<int:product_id>/', views.cart_api_set, name='cart_api_set'),
+    path('api/lines/<int:product_id>/add/', views.cart_api_add, name='cart_api_add'),
+    path('api/lines/<int:product_id>/remove/', views.cart_api_remove, name='cart_api_remove'),
+    path('api/batch/', views.cart_api_batch, name='cart_api_batch'),
 ]
@@ -2,20 +2,42 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from django.utils import timezone
 import json
 from store.models import Product
 from .models import Cart, CartItem
+from . import cart_cache, operations
 
 
 
 # Create your views here.
-def _cart_id(request):
+def _cart_id(request, create=False):
+    """
+    Session key that identifies the visitor's cart.
+
+    Read paths leave create off and get None for a visitor without a
+    session, which is an empty cart; only adding to the cart creates one.
+    """
     cart = request.session.session_key
-    if not cart:
-        cart = request.session.create()
+    if not cart and create:
+        request.session.create()
+        cart = request.session.session_key
     return cart
 
-@login_required(login_url='login')
+def cart_fingerprint(request):
+    """
+    Short string that changes whenever the visitor's active cart items do.
+
+    Used in page validators; served from the cart summary cache (or the
+    anonymous cart storage) and no session is created. Returns '' for a
+    visitor without a cart.
+    """
+    return cart_cache.get_summary(request)['fingerprint']
+
 def add_cart(request, product_id):
     if request.method == 'POST':
 
@@ -24,7 +46,7 @@ def add_cart(request, product_id):
             value = request.POST[key]
 
 
-    product=Product.objects.get(id=product_id)
+    product=get_object_or_404(Product, id=product_id)
     current_user = request.user
     
     # Check if product is in stock
@@ -32,99 +54,44 @@ def add_cart(request, product_id):
         messages.error(request, f'{product.product_name} is out of stock.')
         return redirect('cart')
 
-    # Get or create user's cart (handle multiple carts by getting the latest)
-    cart = Cart.objects.filter(user=current_user, is_active=True).order_by('-updated_at').first()
-    
-    if not cart:
-        cart = Cart.objects.create(
-            cart_id=_cart_id(request),
-            user=current_user,
-            is_active=True
-        )
+    if current_user.is_authenticated:
+        cart = Cart.objects.get_or_create_active(current_user, _cart_id(request, create=True))
+        added = operations.add_item(cart, product, current_user)
     else:
-        # Consolidate if multiple carts exist
-        duplicate_carts = Cart.objects.filter(user=current_user, is_active=True).exclude(id=cart.id)
-        if duplicate_carts.exists():
-            for dup_cart in duplicate_carts:
-                # Move items from duplicate carts to main cart
-                dup_items = CartItem.objects.filter(cart=dup_cart)
-                for dup_item in dup_items:
-                    try:
-                        # Check if item already exists in main cart
-                        existing_item = CartItem.objects.get(
-                            cart=cart,
-                            product=dup_item.product,
-                            user=current_user
-                        )
-                        # Merge quantities
-                        existing_item.quantity += dup_item.quantity
-                        existing_item.save()
-                        dup_item.delete()
-                    except CartItem.DoesNotExist:
-                        # Move item to main cart
-                        dup_item.cart = cart
-                        dup_item.save()
-                dup_cart.delete()
+        # Anonymous carts live in request.anonymous_cart until login.
+        added = request.anonymous_cart.add(product)
+
+    if not added:
+        messages.warning(request, f'Cannot add more. Only {product.stock} items available in stock.')
+        return redirect('cart')
 
-    try:
-        cart_item=CartItem.objects.get(product=product, cart=cart, user=current_user)
-        
-        # Check if adding one more exceeds stock
-        if cart_item.quantity + 1 > product.stock:
-            messages.warning(request, f'Cannot add more. Only {product.stock} items available in stock.')
-            return redirect('cart')
-        
-        cart_item.quantity += 1
-        cart_item.check_stock_availability()
-        cart_item.save()
-    except CartItem.DoesNotExist:
-        cart_item=CartItem.objects.create(
-            product=product,
-            quantity=1,
-            cart=cart,
-            user=current_user
-        )
-        cart_item.save()
-    
     messages.success(request, f'{product.product_name} added to cart.')
     return redirect('cart')
 
-@login_required(login_url='login')
 def remove_cart(request, product_id):
     current_user = request.user
     product=get_object_or_404(Product, id=product_id)
-    try:
-        cart = Cart.objects.filter(user=current_user, is_active=True).order_by('-updated_at').first()
-        if not cart:
-            return redirect('cart')
-        cart_item=CartItem.objects.get(product=product, cart=cart, user=current_user)
-        if cart_item.quantity > 1:
-            cart_item.quantity -= 1
-            cart_item.check_stock_availability()
-            cart_item.save()
-        else:
-            cart_item.delete()
-    except (Cart.DoesNotExist, CartItem.DoesNotExist):
-        pass
+    if not current_user.is_authenticated:
+        request.anonymous_cart.remove(product.id)
+        return redirect('cart')
+    cart = Cart.objects.active_for(current_user)
+    if cart:
+        operations.remove_item(cart, product, current_user)
     return redirect('cart')
 
 
-@login_required(login_url='login')
 def remove_cart_item(request, product_id):
     current_user = request.user
     product=get_object_or_404(Product, id=product_id)
-    try:
-        cart = Cart.objects.filter(user=current_user, is_active=True).order_by('-updated_at').first()
-        if not cart:
-            return redirect('cart')
-        cart_item=CartItem.objects.get(product=product, cart=cart, user=current_user)
-        cart_item.delete()
+    if not current_user.is_authenticated:
+        deleted = request.anonymous_cart.delete(product.id)
+    else:
+        cart = Cart.objects.active_for(current_user)
+        deleted = cart is not None and operations.delete_item(cart, product, current_user)
+    if deleted:
         messages.info(request, f'{product.product_name} removed from cart.')
-    except (Cart.DoesNotExist, CartItem.DoesNotExist):
-        pass
     return redirect('cart')
 
-@login_required(login_url='login')
 def cart(request, total=0, quantity=0, cart_items=None):
     tax = 0
     grand_total = 0
@@ -133,45 +100,30 @@ def cart(request, total=0, quantity=0, cart_items=None):
     current_user = request.user
     
     try:
-        # Get user's active cart (handle multiple by getting latest)
-        cart = Cart.objects.filter(user=current_user, is_active=True).order_by('-updated_at').first()
-        
-        if not cart:
-            raise Cart.DoesNotExist
-        
-        # Consolidate duplicate carts if they exist
-        duplicate_carts = Cart.objects.filter(user=current_user, is_active=True).exclude(id=cart.id)
-        if duplicate_carts.exists():
-            for dup_cart in duplicate_carts:
-                dup_items = CartItem.objects.filter(cart=dup_cart)
-                for dup_item in dup_items:
-                    try:
-                        # Check if item already exists in main cart
-                        existing_item = CartItem.objects.get(
-                            cart=cart,
-                            product=dup_item.product,
-                            user=current_user
-                        )
-                        # Merge quantities
-                        existing_item.quantity += dup_item.quantity
-                        existing_item.save()
-                        dup_item.delete()
-                    except CartItem.DoesNotExist:
-                        # Move item to main cart
-                        dup_item.cart = cart
-                        dup_item.save()
-                dup_cart.delete()
-        
-        cart_items = CartItem.objects.filter(user=current_user, is_active=True).select_related('product').order_by('-created_at')
-        
-        # Validate stock for each cart item
+        if current_user.is_authenticated:
+            cart = Cart.objects.active_for(current_user)
+            if not cart:
+                raise Cart.DoesNotExist
+
+            cart_items = list(
+                CartItem.objects.filter(user=current_user, is_active=True)
+                .select_related('product__category')
+                .prefetch_related('variations')
+                .order_by('-created_at')
+            )
+        else:
+            # CartLine objects built from the anonymous cart storage
+            cart_items = request.anonymous_cart.lines()
+
+        # Validate stock for all cart items, then save the ones that changed in one query
+        changed_items = []
         for cart_item in cart_items:
-            # Update stock status
+            before = (cart_item.quantity, cart_item.is_active, cart_item.is_available, cart_item.stock_status)
             cart_item.check_stock_availability()
-            
+
             product_stock = cart_item.product.stock
             stock_data[str(cart_item.product.id)] = product_stock
-            
+
             # Check if product is out of stock
             if product_stock == 0:
                 stock_warnings[cart_item.product.id] = {
@@ -180,21 +132,37 @@ def cart(request, total=0, quantity=0, cart_items=None):
                 }
                 # Mark as inactive but don't delete yet
                 cart_item.is_active = False
-                cart_item.save()
             # Check if requested quantity exceeds stock
             elif cart_item.quantity > product_stock:
                 stock_warnings[cart_item.product.id] = {
                     'type': 'insufficient_stock',
                     'message': cart_item.get_stock_message()
                 }
-                # Adjust quantity to available stock
-                cart_item.adjust_quantity_to_stock()
                 messages.warning(request, f'{cart_item.product.product_name}: {cart_item.get_stock_message()}')
-            
+                # Adjust quantity to available stock
+                cart_item.quantity = product_stock
+                cart_item.check_stock_availability()
+
+            if (cart_item.quantity, cart_item.is_active, cart_item.is_available, cart_item.stock_status) != before:
+                changed_items.append(cart_item)
+
             # Calculate totals only for items with available stock
             if product_stock > 0 and cart_item.is_active:
                 total += cart_item.sub_total()
                 quantity += cart_item.quantity
+
+        if changed_items and not current_user.is_authenticated:
+            for cart_item in changed_items:
+                request.anonymous_cart.set(cart_item.product.id, cart_item.quantity)
+        elif changed_items:
+            # bulk_update() skips auto_now and the CartItem signals.
+            now = timezone.now()
+            for cart_item in changed_items:
+                cart_item.updated_at = now
+            CartItem.objects.bulk_update(
+                changed_items, ['quantity', 'is_active', 'is_available', 'stock_status', 'updated_at']
+            )
+            cart_cache.invalidate_user(current_user.pk)
         
         tax= (2 * total)/100
         grand_total= total + tax
@@ -221,7 +189,7 @@ def checkout(request, total=0, quantity=0, cart_items=None):
     current_user = request.user
     
     try:
-        cart = Cart.objects.filter(user=current_user, is_active=True).order_by('-updated_at').first()
+        cart = Cart.objects.active_for(current_user)
         if not cart:
             raise Cart.DoesNotExist
         cart_items = CartItem.objects.filter(cart=cart, user=current_user, is_active=True, is_available=True)
@@ -250,3 +218,173 @@ def checkout(request, total=0, quantity=0, cart_items=None):
         'grand_total': grand_total,
     }
     return render(request, 'store/checkout.html', context)
+
+
+# JSON cart API, used by the cart page to change quantities without a reload
+CART_ACTIONS = ('set', 'add', 'remove')
+
+
+def _int(value, name, minimum):
+    if isinstance(value, bool):
+        raise ValueError(f'"{name}" must be an integer.')
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'"{name}" must be an integer.')
+    if value < minimum:
+        raise ValueError(f'"{name}" must be at least {minimum}.')
+    return value
+
+
+def _parse_change(change, product_id=None, action='set'):
+    """(product_id, action, quantity) from one change object of the API"""
+    if not isinstance(change, dict):
+        raise ValueError('Each change must be an object.')
+    action = change.get('action', action)
+    if action not in CART_ACTIONS:
+        raise ValueError(f'Unknown action "{action}".')
+    if product_id is None:
+        product_id = _int(change.get('product'), 'product', 1)
+    quantity = _int(change.get('quantity', 1), 'quantity', 0 if action == 'set' else 1)
+    return product_id, action, quantity
+
+
+def _json_body(request):
+    if not request.body:
+        return {}
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        raise ValueError('The request body must be JSON.')
+
+
+def _apply_changes(request, changes, products):
+    """
+    Apply (product_id, action, quantity) changes to the visitor's cart.
+
+    'set' caps the quantity at the product's stock (0 removes the line),
+    'add' adds `quantity` unless that would exceed the stock and 'remove'
+    takes one unit out. Returns {product_id: message} for the changes that
+    were capped or refused.
+    """
+    notes = {}
+    current_user = request.user
+    if current_user.is_authenticated:
+        cart = Cart.objects.get_or_create_active(current_user, _cart_id(request, create=True))
+    for product_id, action, quantity in changes:
+        product = products[product_id]
+        applied = True
+        if not current_user.is_authenticated:
+            storage = request.anonymous_cart
+            if action == 'set':
+                applied = quantity <= product.stock
+                storage.set(product_id, min(quantity, product.stock))
+            elif action == 'add':
+                applied = storage.add(product, quantity)
+            else:
+                storage.remove(product_id)
+        elif action == 'set':
+            applied = operations.set_quantity(cart, product, current_user, quantity) == quantity
+        elif action == 'add':
+            applied = operations.add_item(cart, product, current_user, quantity)
+        else:
+            operations.remove_item(cart, product, current_user)
+        if not applied:
+            notes[product_id] = (
+                'Out of Stock' if product.stock == 0
+                else f'Not enough in stock. Only {product.stock} available.'
+            )
+    return notes
+
+
+def _cart_state(request, product_ids, notes):
+    """Line totals of `product_ids` and the cart summary, with the cart page's rules"""
+    if request.user.is_authenticated:
+        cart_items = CartItem.objects.filter(user=request.user, is_active=True).select_related('product__category')
+    else:
+        cart_items = request.anonymous_cart.lines()
+
+    total = 0
+    quantity = 0
+    count = 0
+    lines = {product_id: {'product': product_id, 'quantity': 0, 'sub_total': 0} for product_id in product_ids}
+    for cart_item in cart_items:
+        count += cart_item.quantity
+        if cart_item.product.stock > 0:
+            total += cart_item.sub_total()
+            quantity += cart_item.quantity
+        if cart_item.product.id in lines:
+            lines[cart_item.product.id].update(
+                quantity=cart_item.quantity, sub_total=cart_item.sub_total(), stock=cart_item.product.stock,
+            )
+    for product_id, message in notes.items():
+        lines[product_id]['message'] = message
+
+    tax = (2 * total) / 100
+    return {
+        'lines': list(lines.values()),
+        'summary': {
+            'count': count,
+            'quantity': quantity,
+            'total': total,
+            'tax': tax,
+            'grand_total': total + tax,
+        },
+    }
+
+
+def _cart_api_response(request, changes):
+    products = Product.objects.in_bulk({product_id for product_id, _, _ in changes})
+    missing = sorted({product_id for product_id, _, _ in changes} - set(products))
+    if missing:
+        return JsonResponse({'error': f'Unknown products: {missing}'}, status=404)
+    # All changes commit together, or none of them do.
+    with transaction.atomic():
+        notes = _apply_changes(request, changes, products)
+    product_ids = list(dict.fromkeys(product_id for product_id, _, _ in changes))
+    return JsonResponse(_cart_state(request, product_ids, notes))
+
+
+def _single_change(request, product_id, action):
+    try:
+        change = _parse_change(_json_body(request), product_id, action)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return _cart_api_response(request, [change])
+
+
+@require_POST
+def cart_api_set(request, product_id):
+    """Set a line's quantity: {"quantity": n}"""
+    return _single_change(request, product_id, 'set')
+
+
+@require_POST
+def cart_api_add(request, product_id):
+    """Add to a line: {"quantity": n}, one unit by default"""
+    return _single_change(request, product_id, 'add')
+
+
+@require_POST
+def cart_api_remove(request, product_id):
+    """Take one unit out of a line"""
+    return _single_change(request, product_id, 'remove')
+
+
+@require_POST
+def cart_api_batch(request):
+    """
+    Apply several changes in one transaction.
+
+    Body: {"changes": [{"product": id, "action": "set", "quantity": n}, ...]}
+    """
+    try:
+        changes = _json_body(request).get('changes')
+        if not isinstance(changes, list) or not changes:
+            raise ValueError('"changes" must be a non-empty list.')
+        if len(changes) > settings.CART_API_MAX_CHANGES:
+            raise ValueError(f'At most {settings.CART_API_MAX_CHANGES} changes per request.')
+        changes = [_parse_change(change) for change in changes]
+    except (AttributeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return _cart_api_response(request, changes)
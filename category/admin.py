@@ -5,5 +5,6 @@ from .models import Category
 
 class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug':('category_name',)}
-    list_display = ('category_name', 'slug', )
+    list_display = ('category_name', 'slug', 'product_count', 'in_stock_count')
+    readonly_fields = ('product_count', 'in_stock_count')
 admin.site.register(Category, CategoryAdmin)
\ No newline at end of file
@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from . import menu
+from .models import Category
+
+
+def product_contribution(category_id, is_available, stock):
+    """What one product adds to its category's (product_count, in_stock_count)"""
+    available = 1 if is_available else 0
+    in_stock = 1 if is_available and stock > 0 else 0
+    return category_id, available, in_stock
+
+
+def apply_changes(changes):
+    """
+    Apply counter deltas for a batch of product changes.
+
+    `changes` is an iterable of (old, new) contributions as returned by
+    product_contribution(); either side may be None for creates/deletes.
+    Returns the ids of the categories whose counters moved. Raw saves
+    (fixtures) are not counted; run recount_products after loading them.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for old, new in changes:
+        if old is not None:
+            deltas[old[0]][0] -= old[1]
+            deltas[old[0]][1] -= old[2]
+        if new is not None:
+            deltas[new[0]][0] += new[1]
+            deltas[new[0]][1] += new[2]
+
+    changed = []
+    with transaction.atomic():
+        for category_id, (available, in_stock) in sorted(deltas.items()):
+            if not available and not in_stock:
+                continue
+            Category.objects.filter(pk=category_id).update(
+                # Clamped at zero: products saved raw (loaddata) were never
+                # counted, so deleting them must not push a counter negative.
+                product_count=Greatest(F('product_count') + available, 0),
+                in_stock_count=Greatest(F('in_stock_count') + in_stock, 0),
+            )
+            changed.append(category_id)
+    if changed:
+        transaction.on_commit(menu.invalidate)
+    return changed
+
+
+def recount(category_ids=None):
+    """Recompute the counters from the Product table; returns the number of categories corrected"""
+    from store.models import Product
+
+    products = Product.objects.all()
+    categories = Category.objects.all()
+    if category_ids is not None:
+        products = products.filter(category_id__in=category_ids)
+        categories = categories.filter(pk__in=category_ids)
+
+    totals = {
+        row['category_id']: (row['available'], row['in_stock'])
+        for row in products.values('category_id').annotate(
+            available=Count('id', filter=Q(is_available=True)),
+            in_stock=Count('id', filter=Q(is_available=True, stock__gt=0)),
+        ).order_by()
+    }
+
+    with transaction.atomic():
+        stale = []
+        for category in categories.select_for_update().only('id', 'product_count', 'in_stock_count'):
+            available, in_stock = totals.get(category.pk, (0, 0))
+            if (category.product_count, category.in_stock_count) != (available, in_stock):
+                category.product_count = available
+                category.in_stock_count = in_stock
+                stale.append(category)
+        Category.objects.bulk_update(stale, ['product_count', 'in_stock_count'], batch_size=500)
+        if stale:
+            transaction.on_commit(menu.invalidate)
+    return len(stale)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from category.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized product counters on every category'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recounting category products...')
+        corrected = recount()
+        self.stdout.write(self.style.SUCCESS(f'Successfully corrected {corrected} categories'))
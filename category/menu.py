@@ -0,0 +1,77 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Category
+
+
+VERSION_KEY = 'category_menu:version'
+
+
+class MenuLink:
+    """Plain snapshot of a Category row with its URL resolved up front"""
+    __slots__ = ('id', 'category_name', 'slug', 'url', 'product_count', 'in_stock_count')
+
+    def __init__(self, category):
+        self.id = category.id
+        self.category_name = category.category_name
+        self.slug = category.slug
+        self.url = reverse('products_by_category', args=[category.slug])
+        self.product_count = category.product_count
+        self.in_stock_count = category.in_stock_count
+
+    def get_url(self):
+        return self.url
+
+    def __str__(self):
+        return self.category_name
+
+
+# (version, links) built by this process; replaced wholesale, never mutated.
+# The version lives in the default cache, which every process shares (see
+# settings.CACHES), so an invalidation anywhere makes each process rebuild.
+_menu = (None, ())
+_lock = threading.Lock()
+# (version, time.monotonic() it was read) of the shared version, as this process last saw it.
+_version = (None, 0)
+
+
+def menu_version():
+    """
+    Shared menu version: a time.time_ns() stamp of the last invalidation.
+
+    Read from the cache at most once per MENU_VERSION_CHECK_INTERVAL
+    seconds, so rendering the menu costs no query in between; other
+    processes' invalidations show up within that interval.
+    """
+    global _version
+    version, read_at = _version
+    now = time.monotonic()
+    if version is None or now - read_at >= settings.MENU_VERSION_CHECK_INTERVAL:
+        version = cache.get_or_set(VERSION_KEY, time.time_ns, None)
+        _version = (version, now)
+    return version
+
+
+def invalidate():
+    """Move the shared version; this process sees it at once, the others within the check interval"""
+    global _version
+    version = time.time_ns()
+    cache.set(VERSION_KEY, version, None)
+    _version = (version, time.monotonic())
+
+
+def get_menu():
+    """Category links for templates; hits the database only after an invalidation"""
+    global _menu
+    version = menu_version()
+    if _menu[0] != version:
+        with _lock:
+            if _menu[0] != version:
+                links = tuple(MenuLink(category) for category in Category.objects.all())
+                _menu = (version, links)
+    return _menu[1]
+
@@ -0,0 +1,40 @@
+# Generated by Django 3.1 on 2026-10-17 18:41
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_counters(apps, schema_editor):
+    Category = apps.get_model('category', 'Category')
+    Product = apps.get_model('store', 'Product')
+    totals = Product.objects.values('category_id').annotate(
+        available=Count('id', filter=Q(is_available=True)),
+        in_stock=Count('id', filter=Q(is_available=True, stock__gt=0)),
+    ).order_by()
+    for row in totals:
+        Category.objects.filter(pk=row['category_id']).update(
+            product_count=row['available'],
+            in_stock_count=row['in_stock'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0002_auto_20260127_2345'),
+        ('store', '0004_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='in_stock_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,10 @@ class Category(models.Model):
     description = models.TextField(max_length=255, blank=True)
     cat_image = models.ImageField(upload_to='photos/categories', blank=True)
 
+    # Denormalized counters, maintained by category.counters
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+
     class Meta:
         verbose_name = 'category'
         verbose_name_plural = 'categories'
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from store import autocomplete, feed
+from . import menu
+from .models import Category
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(menu.invalidate)
+    # Product links embed the category slug.
+    transaction.on_commit(feed.invalidate)
+    transaction.on_commit(autocomplete.reset)
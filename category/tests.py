@@ -1,3 +1,97 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from store.models import Product
+from . import menu
+from .models import Category
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        self.shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        self.hats = Category.objects.create(category_name='Hats', slug='hats')
+
+    def make_product(self, **fields):
+        fields = {'slug': 'shirt', 'price': 10, 'stock': 5, 'category': self.shirts, **fields}
+        return Product.objects.create(product_name='Shirt', images='photos/products/shirt.jpg', **fields)
+
+    def counts(self, category):
+        category.refresh_from_db()
+        return category.product_count, category.in_stock_count
+
+    def test_create(self):
+        self.make_product()
+        self.make_product(slug='empty', stock=0)
+        self.make_product(slug='hidden', is_available=False)
+        self.assertEqual(self.counts(self.shirts), (2, 1))
+
+    def test_update_stock_and_availability(self):
+        product = self.make_product()
+        product.stock = 0
+        product.save()
+        self.assertEqual(self.counts(self.shirts), (1, 0))
+        product.is_available = False
+        product.save()
+        self.assertEqual(self.counts(self.shirts), (0, 0))
+        product.is_available = True
+        product.stock = 2
+        product.save()
+        self.assertEqual(self.counts(self.shirts), (1, 1))
+
+    def test_category_move(self):
+        product = self.make_product()
+        product.category = self.hats
+        product.save()
+        self.assertEqual(self.counts(self.shirts), (0, 0))
+        self.assertEqual(self.counts(self.hats), (1, 1))
+
+    def test_delete(self):
+        self.make_product().delete()
+        self.assertEqual(self.counts(self.shirts), (0, 0))
+
+    def test_delete_of_uncounted_product_stops_at_zero(self):
+        product = self.make_product()
+        # As if the product had been loaded from a fixture (raw save, never counted).
+        Category.objects.filter(pk=self.shirts.pk).update(product_count=0, in_stock_count=0)
+        product.delete()
+        self.assertEqual(self.counts(self.shirts), (0, 0))
+
+
+class MenuTests(TestCase):
+
+    def setUp(self):
+        for name in ('_menu', '_version'):
+            self.addCleanup(setattr, menu, name, getattr(menu, name))
+        menu._menu, menu._version = (None, ()), (None, 0)
+        Category.objects.create(category_name='Shirts', slug='shirts')
+
+    def names(self):
+        return [link.category_name for link in menu.get_menu()]
+
+    def test_warm_menu_costs_no_queries(self):
+        self.names()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ['Shirts'])
+            menu.menu_version()
+
+    def test_login_page_runs_no_menu_queries(self):
+        self.client.get(reverse('login'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('login'))
+
+    def test_invalidation_here_rebuilds_at_once(self):
+        self.names()
+        Category.objects.create(category_name='Hats', slug='hats')
+        menu.invalidate()
+        self.assertEqual(self.names(), ['Shirts', 'Hats'])
+
+    def test_invalidation_elsewhere_is_seen_after_the_interval(self):
+        self.names()
+        Category.objects.create(category_name='Hats', slug='hats')
+        # Another process moves the shared version.
+        cache.set(menu.VERSION_KEY, menu.menu_version() + 1, None)
+        self.assertEqual(self.names(), ['Shirts'])
+        with override_settings(MENU_VERSION_CHECK_INTERVAL=0):
+            self.assertEqual(self.names(), ['Shirts', 'Hats'])
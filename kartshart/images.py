@@ -0,0 +1,159 @@
+"""
+Thumbnail and WebP derivatives of uploaded images.
+
+For an upload such as photos/products/shirt.png, derivatives are written next
+to MEDIA_ROOT as derivatives/photos/products/shirt_320w.png and
+derivatives/photos/products/shirt_320w.webp, one pair per width in
+IMAGE_DERIVATIVE_WIDTHS that is narrower than the original.
+
+They are written by the generate_image_derivatives command (run it after
+uploads, e.g. from cron), never in a web request: until then pages simply
+serve the original upload.
+"""
+import logging
+import os
+import posixpath
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_DIR = 'derivatives'
+# Formats Pillow can write that we keep as-is; anything else falls back to JPEG.
+FALLBACK_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}
+
+
+def derivative_name(name, width, ext=None):
+    """Storage name of the derivative of `name` at `width`; ext defaults to the fallback format's"""
+    stem, source_ext = posixpath.splitext(name)
+    if ext is None:
+        ext = source_ext.lower() if source_ext.lower() in FALLBACK_FORMATS else '.jpg'
+    return posixpath.join(DERIVATIVE_DIR, f'{stem}_{width}w{ext}')
+
+
+def _save(image, path, image_format, quality):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(tmp_path, image_format, quality=quality)
+    os.replace(tmp_path, path)
+
+
+def render_derivatives(media_root, name, widths, quality=80, force=False):
+    """
+    Write the derivatives of one image; returns the names written.
+
+    Runs in worker processes, so it only touches Pillow and the filesystem.
+    Derivatives newer than the source are left alone unless `force` is set.
+    """
+    source = os.path.join(media_root, name)
+    if not os.path.exists(source):
+        return []
+    source_mtime = os.path.getmtime(source)
+
+    def is_stale(target):
+        path = os.path.join(media_root, target)
+        return force or not os.path.exists(path) or os.path.getmtime(path) < source_mtime
+
+    written = []
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA', 'L'):
+            original = original.convert('RGBA')
+        for width in sorted(widths):
+            if width >= original.width:
+                break
+            fallback = derivative_name(name, width)
+            targets = [
+                (fallback, FALLBACK_FORMATS.get(posixpath.splitext(fallback)[1], 'JPEG')),
+                (derivative_name(name, width, '.webp'), 'WEBP'),
+            ]
+            pending = [(target, image_format) for target, image_format in targets if is_stale(target)]
+            if not pending:
+                continue
+            height = max(1, round(original.height * width / original.width))
+            resized = original.resize((width, height), Image.LANCZOS)
+            for target, image_format in pending:
+                _save(resized, os.path.join(media_root, target), image_format, quality)
+                written.append(target)
+    return written
+
+
+def render_args(name, force=False):
+    """Arguments of render_derivatives() for a stored image, or None if it has no local path"""
+    if not name:
+        return None
+    try:
+        default_storage.path(name)
+    except NotImplementedError:
+        logger.warning('Skipping derivatives of %s: storage has no local paths', name)
+        return None
+    return (str(settings.MEDIA_ROOT), name, settings.IMAGE_DERIVATIVE_WIDTHS, settings.IMAGE_DERIVATIVE_QUALITY, force)
+
+
+# name -> (lookup() result, checked at); what lookup() found on disk in this process.
+_found = {}
+_found_lock = threading.Lock()
+FOUND_MAX_ENTRIES = 10000
+# EXIF orientations that turn the image by 90 degrees (render_derivatives() applies them).
+ROTATED = {5, 6, 7, 8}
+
+
+def lookup(name):
+    """
+    (width, fallback, webp) of a stored image: the width of the original
+    (None if it can't be read) and the [(url, width)] of its derivatives
+    on disk in the fallback format and in WebP.
+
+    Remembered per process, so a page doesn't stat every derivative of every
+    image on each render: a complete set (every width the command makes for
+    an image this size) is kept, an incomplete one is looked at again after
+    IMAGE_DERIVATIVE_RECHECK seconds.
+    """
+    if not name:
+        return None, [], []
+    found = _found.get(name)
+    now = time.monotonic()
+    if found is not None and (found[1] is None or now - found[1] < settings.IMAGE_DERIVATIVE_RECHECK):
+        return found[0]
+    result = _find(name)
+    width, fallback, webp = result
+    expected = len([w for w in settings.IMAGE_DERIVATIVE_WIDTHS if width is not None and w < width])
+    complete = width is not None and len(fallback) == len(webp) == expected
+    with _found_lock:
+        if len(_found) >= FOUND_MAX_ENTRIES:
+            _found.clear()
+        _found[name] = (result, None if complete else now)
+    return result
+
+
+def _find(name):
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        return None, [], []
+    try:
+        # Reads the header only.
+        with Image.open(path) as original:
+            width = original.height if original.getexif().get(0x0112) in ROTATED else original.width
+    except OSError:
+        return None, [], []
+    return width, _existing(name, width, None), _existing(name, width, '.webp')
+
+
+def _existing(name, width, ext):
+    candidates = []
+    for derivative_width in sorted(settings.IMAGE_DERIVATIVE_WIDTHS):
+        if derivative_width >= width:
+            break
+        derivative = derivative_name(name, derivative_width, ext)
+        if not os.path.exists(default_storage.path(derivative)):
+            break
+        candidates.append((default_storage.url(derivative), derivative_width))
+    return candidates
@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from category.models import Category
+from kartshart import images
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate missing thumbnail and WebP derivatives for product and category images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate derivatives even when they are up to date')
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_DERIVATIVE_WORKERS,
+                            help='Number of processes resizing images')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Generating image derivatives...')
+        started = time.monotonic()
+
+        names = set(Product.objects.exclude(images='').values_list('images', flat=True).iterator())
+        names.update(Category.objects.exclude(cat_image='').values_list('cat_image', flat=True))
+
+        jobs = [args for args in (images.render_args(name, options['force']) for name in sorted(names)) if args]
+        written = 0
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('No images to process'))
+            return
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            for done, names_written in enumerate(executor.map(images.render_derivatives, *zip(*jobs)), 1):
+                written += len(names_written)
+                if done % 100 == 0:
+                    self.stdout.write(f'  Processed {done}/{len(jobs)} images')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully wrote {written} derivatives for {len(jobs)} images in {elapsed:.1f}s'
+        ))
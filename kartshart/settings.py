@@ -39,10 +39,10 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'kartshart',
-    'category',
+    'category.apps.CategoryConfig',
     'accounts',
-    'store',
-    'carts',
+    'store.apps.StoreConfig',
+    'carts.apps.CartsConfig',
     'orders',
 ]
 
@@ -53,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'carts.middleware.AnonymousCartMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -91,6 +92,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# The home feed, category menu, autocomplete index and cart summaries are
+# invalidated by moving a version key in this cache, so it must be shared by
+# every process: the database cache table by default (python manage.py
+# createcachetable), or e.g. memcached via CACHE_BACKEND and CACHE_LOCATION.
+# A process-local backend such as LocMemCache only suits a single process.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'kartshart_cache'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -141,6 +158,64 @@ if os.environ.get('VERCEL'):
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Thumbnail/WebP derivatives of uploaded images (see kartshart.images)
+IMAGE_DERIVATIVE_WIDTHS = (80, 320, 640)
+IMAGE_DERIVATIVE_QUALITY = 80
+# Processes used by the generate_image_derivatives command
+IMAGE_DERIVATIVE_WORKERS = 2
+# Seconds before pages look again for derivatives that were missing
+IMAGE_DERIVATIVE_RECHECK = 60
+
+# Store listings
+STORE_PRODUCTS_PER_PAGE = 6
+# Listings with more pages than this switch from ?page=N to cursor paging
+STORE_PAGE_NUMBER_LIMIT = 20
+STORE_SHOW_PRODUCT_COUNT = True
+# Lower bounds of the price range facet buckets
+STORE_PRICE_BUCKETS = (0, 50, 100, 150, 200, 500, 1000, 2000)
+
+# Search-as-you-type suggestions (store.autocomplete)
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_ENTRIES = 200000
+# Seconds a process keeps its index after another process changed products
+AUTOCOMPLETE_REBUILD_INTERVAL = 60
+
+# Products fetched per query by the catalog feed export (store.export)
+CATALOG_FEED_CHUNK_SIZE = 500
+# Days deleted products are reported by incremental feeds; consumers that sync less
+# often than this need a full export
+CATALOG_FEED_TOMBSTONE_DAYS = 30
+
+# "Bought together" products kept per product (orders.recommendations) and shown on its page
+BOUGHT_TOGETHER_TOP_K = 8
+BOUGHT_TOGETHER_SIZE = 4
+# Hours the job keeps looking for order lines committed after it moved past their id
+BOUGHT_TOGETHER_LATE_HOURS = 24
+
+# Seconds a cart summary (navbar count) stays cached in the shared default cache;
+# changes invalidate it sooner
+CART_SUMMARY_TIMEOUT = 60 * 60
+
+# Where anonymous carts are kept until login (carts.storage): a signed cookie
+# (carts.storage.cookie.CookieCartStorage) or the cache, under a token cookie
+# (carts.storage.cache.CacheCartStorage; needs a cache shared by all processes)
+CART_STORAGE = 'carts.storage.cookie.CookieCartStorage'
+CART_COOKIE_NAME = 'cart'
+CART_COOKIE_AGE = 60 * 60 * 24 * 14
+# Most line changes accepted by one request to the cart batch API
+CART_API_MAX_CHANGES = 100
+# Days after which purge_carts deletes anonymous and inactive carts and inactive cart items
+CART_PURGE_AFTER_DAYS = 30
+
+# Seconds each process reuses the category menu version before reading the shared
+# cache again (category.menu)
+MENU_VERSION_CHECK_INTERVAL = 5
+
+# Home page feed: 'newest', 'featured' or 'best_selling'
+HOME_FEED_STRATEGY = 'newest'
+HOME_FEED_SIZE = 8
+HOME_FEED_TIMEOUT = 60 * 15
+
 # Authentication Settings
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
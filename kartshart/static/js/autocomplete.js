@@ -0,0 +1,64 @@
+// Search-as-you-type suggestions for the navbar search box
+
+$(document).ready(function() {
+    var $input = $('input[data-autocomplete-url]');
+    if (!$input.length) {
+        return;
+    }
+    var $menu = $input.siblings('.search-suggestions');
+    var url = $input.data('autocomplete-url');
+    var timer = null;
+    var pending = null;
+    var lastQuery = null;
+
+    function render(results) {
+        $menu.empty();
+        if (!results.length) {
+            $menu.removeClass('show');
+            return;
+        }
+        $.each(results, function(i, result) {
+            var $link = $('<a class="dropdown-item"></a>').attr('href', result.url).text(result.label);
+            if (result.type === 'category') {
+                $link.prepend('<i class="fa fa-folder-open text-muted mr-2"></i>');
+            }
+            $menu.append($link);
+        });
+        $menu.addClass('show');
+    }
+
+    function lookup() {
+        var query = $.trim($input.val());
+        if (query === lastQuery) {
+            return;
+        }
+        lastQuery = query;
+        if (pending) {
+            pending.abort();
+        }
+        if (!query) {
+            render([]);
+            return;
+        }
+        pending = $.getJSON(url, {q: query}, function(data) {
+            render(data.results);
+        });
+    }
+
+    $input.on('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(lookup, 150);
+    });
+
+    $input.on('keydown', function(e) {
+        if (e.which === 27) {
+            $menu.removeClass('show');
+        }
+    });
+
+    $(document).on('click', function(e) {
+        if (!$(e.target).closest($input).length) {
+            $menu.removeClass('show');
+        }
+    });
+});
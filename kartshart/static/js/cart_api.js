@@ -0,0 +1,96 @@
+// Cart page: quantity buttons go through the cart API instead of reloading the page.
+// Clicks are collected for a moment and sent as one batch request.
+
+$(document).ready(function() {
+    var $table = $('table[data-cart-api]');
+    if (!$table.length) {
+        return;
+    }
+    var url = $table.data('cart-api');
+    var csrfToken = $table.data('csrf-token');
+    var pending = {};
+    var timer = null;
+    var busy = false;
+
+    function row(productId) {
+        return $table.find('tr[data-product-id="' + productId + '"]');
+    }
+
+    function render(data) {
+        $.each(data.lines, function(i, line) {
+            var $row = row(line.product);
+            if (!line.quantity) {
+                $row.remove();
+            } else {
+                // Leave lines clicked again since the request was sent to the next response.
+                if (pending[line.product] === undefined) {
+                    $row.find('[data-line-quantity]').val(line.quantity);
+                }
+                $row.attr('data-stock', line.stock);
+                $row.find('[data-line-subtotal]').text(line.sub_total);
+            }
+            $row.find('[data-line-message]').text(line.message || '');
+            if (typeof updateCartQuantity === 'function') {
+                updateCartQuantity(String(line.product), line.quantity, line.stock || 0);
+            }
+        });
+        $('[data-cart-total]').text(data.summary.total);
+        $('[data-cart-tax]').text(data.summary.tax);
+        $('[data-cart-grand-total]').text(data.summary.grand_total);
+        $('.notify').text(data.summary.count);
+        if (!$table.find('tr[data-product-id]').length) {
+            // Show the empty cart page.
+            window.location.reload();
+        }
+    }
+
+    function flush() {
+        timer = null;
+        if (busy) {
+            schedule();
+            return;
+        }
+        var changes = $.map(pending, function(quantity, productId) {
+            return {product: Number(productId), action: 'set', quantity: quantity};
+        });
+        if (!changes.length) {
+            return;
+        }
+        pending = {};
+        busy = true;
+        $.ajax({
+            url: url,
+            type: 'POST',
+            contentType: 'application/json',
+            data: JSON.stringify({changes: changes}),
+            headers: {'X-CSRFToken': csrfToken}
+        }).done(render).fail(function() {
+            window.location.reload();
+        }).always(function() {
+            busy = false;
+        });
+    }
+
+    function schedule() {
+        clearTimeout(timer);
+        timer = setTimeout(flush, 300);
+    }
+
+    $table.on('click', '[data-cart-step]', function(e) {
+        e.preventDefault();
+        var $row = $(this).closest('tr');
+        var $quantity = $row.find('[data-line-quantity]');
+        var stock = Number($row.attr('data-stock'));
+        var quantity = Math.min(Math.max(Number($quantity.val()) + Number($(this).data('cart-step')), 0), stock);
+        $quantity.val(quantity);
+        pending[$row.data('product-id')] = quantity;
+        schedule();
+    });
+
+    $table.on('click', '[data-cart-delete]', function(e) {
+        e.preventDefault();
+        pending[$(this).closest('tr').data('product-id')] = 0;
+        clearTimeout(timer);
+        flush();
+    });
+});
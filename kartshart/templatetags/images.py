@@ -0,0 +1,38 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from kartshart import images
+
+register = template.Library()
+
+
+def _srcset(candidates):
+    return ', '.join(f'{url} {width}w' for url, width in candidates)
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', **attrs):
+    """
+    <picture> for an ImageField file: a WebP source (when there are WebP
+    thumbnails) plus an <img> with a srcset of the thumbnails in the original
+    format; both srcsets end with the original upload.
+    Usage: {% responsive_image product.images sizes="(max-width: 576px) 100vw, 25vw" class="img-sm" %}
+    """
+    if not image:
+        return ''
+    width, fallback, webp = images.lookup(image.name)
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    if not fallback:
+        return format_html('<img src="{}"{}>', image.url, extra)
+    # With width descriptors, browsers ignore src: list the original too, for
+    # screens that need more pixels than the largest thumbnail.
+    original = [(image.url, width)]
+    img = format_html(
+        '<img src="{}" srcset="{}" sizes="{}"{}>', image.url, _srcset(fallback + original), sizes, extra,
+    )
+    if not webp:
+        return img
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">{}</picture>',
+        _srcset(webp + original), sizes, img,
+    )
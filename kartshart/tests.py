@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from . import images
+from .templatetags.images import responsive_image
+
+
+class ResponsiveImageTests(SimpleTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, MEDIA_URL='/media/', IMAGE_DERIVATIVE_WIDTHS=(80, 320, 640))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        images._found.clear()
+        self.addCleanup(images._found.clear)
+        self.media_root = media_root
+
+    def upload(self, name, size):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.new('RGB', size).save(path)
+        return _File(name)
+
+    def render(self, name):
+        return images.render_derivatives(self.media_root, name, (80, 320, 640))
+
+    def test_render_derivatives_skips_widths_wider_than_the_original(self):
+        self.upload('photos/shirt.png', (400, 200))
+        self.assertEqual(self.render('photos/shirt.png'), [
+            'derivatives/photos/shirt_80w.png', 'derivatives/photos/shirt_80w.webp',
+            'derivatives/photos/shirt_320w.png', 'derivatives/photos/shirt_320w.webp',
+        ])
+        with Image.open(os.path.join(self.media_root, 'derivatives/photos/shirt_320w.webp')) as derivative:
+            self.assertEqual(derivative.size, (320, 160))
+        # Up to date: nothing is written again.
+        self.assertEqual(self.render('photos/shirt.png'), [])
+
+    def test_tag_without_derivatives_is_a_plain_img(self):
+        image = self.upload('photos/shirt.png', (400, 200))
+        self.assertEqual(responsive_image(image, alt='Shirt'), '<img src="/media/photos/shirt.png" alt="Shirt">')
+
+    def test_tag_lists_thumbnails_and_the_original(self):
+        image = self.upload('photos/shirt.png', (400, 200))
+        self.render('photos/shirt.png')
+        html = responsive_image(image, sizes='25vw')
+        self.assertIn(
+            '<source type="image/webp" srcset="/media/derivatives/photos/shirt_80w.webp 80w, '
+            '/media/derivatives/photos/shirt_320w.webp 320w, /media/photos/shirt.png 400w" sizes="25vw">',
+            html,
+        )
+        self.assertIn(
+            'srcset="/media/derivatives/photos/shirt_80w.png 80w, '
+            '/media/derivatives/photos/shirt_320w.png 320w, /media/photos/shirt.png 400w"',
+            html,
+        )
+
+    def test_small_image_counts_as_complete(self):
+        self.upload('photos/icon.png', (100, 100))
+        self.render('photos/icon.png')
+        images.lookup('photos/icon.png')
+        self.assertIsNone(images._found['photos/icon.png'][1])
+
+
+class _File:
+    """The bits of an ImageFieldFile the tag uses"""
+
+    def __init__(self, name):
+        self.name = name
+        self.url = default_storage.url(name)
+
+    def __bool__(self):
+        return True
@@ -1,11 +1,18 @@
 from django.shortcuts import render
-from store.models import Product
 
+# Create your views here.
+from django.conf import settings
+from store import feed
+from store.conditional import catalog_condition, home_validator
+
+@catalog_condition(home_validator)
 def home(request):
 
-    products=Product.objects.all().filter(is_available=True)
     context={
-        'products':products,
+        # Callable, so the feed is only loaded when the fragment cache misses.
+        'products': feed.get_feed_products,
+        'feed_version': feed.feed_version(),
+        'feed_timeout': settings.HOME_FEED_TIMEOUT,
     }
 
-    return render(request, 'home.html', context)
\ No newline at end of file
+    return render(request, 'home.html', context)
@@ -15,5 +15,9 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kartshart.settings')
 
 application = get_wsgi_application()
 
+# Start building the search autocomplete index; requests don't wait for it.
+from store import autocomplete  # noqa: E402
+autocomplete.warm()
+
 # Vercel serverless function handler
 app = application
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Count products bought together in orders placed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of order lines counted per transaction')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the counts and start again from the first order')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write('Discarding bought-together counts...')
+            recommendations.reset()
+        self.stdout.write('Counting products bought together...')
+
+        started = time.monotonic()
+        processed = recommendations.update(batch_size=options['batch_size'], stdout=self.stdout)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully counted {processed} order lines in {elapsed:.1f}s '
+            f'({processed / max(elapsed, 0.001):.0f} rows/sec)'
+        ))
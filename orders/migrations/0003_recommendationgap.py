@@ -0,0 +1,20 @@
+# Generated by Django 3.1 on 2026-10-17 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_bought_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationGap',
+            fields=[
+                ('order_product_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
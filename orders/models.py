@@ -67,3 +67,45 @@ class OrderProduct(models.Model):
 
     def __str__(self):
         return self.product.product_name
+
+
+class ProductPairCount(models.Model):
+    """Number of orders in which two products were bought together, stored in both directions"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['product', 'related']]
+        indexes = [
+            models.Index(fields=['product', '-count', 'related']),
+        ]
+
+
+class BoughtTogether(models.Model):
+    """One of the top-K products most often bought with `product`, maintained by orders.recommendations"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='bought_together')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='bought_with')
+    rank = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [['product', 'rank']]
+
+
+class RecommendationState(models.Model):
+    """Watermark of the bought-together job: the last OrderProduct id it has counted"""
+    last_order_product_id = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class RecommendationGap(models.Model):
+    """
+    An OrderProduct id below the watermark that the bought-together job
+    hasn't counted: not yet committed (or not yet ordered) when the
+    watermark passed it. Looked up again on every run until it is counted
+    or BOUGHT_TOGETHER_LATE_HOURS have passed.
+    """
+    order_product_id = models.PositiveIntegerField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True)
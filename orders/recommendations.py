@@ -0,0 +1,174 @@
+"""
+"Frequently bought together" recommendations.
+
+update() is the offline job. It reads OrderProduct rows past the
+watermark in RecommendationState, adds one to ProductPairCount for every
+pair of distinct products that newly share an order, then rewrites the
+BoughtTogether top-K rows of the products it touched. Each batch commits
+together with the watermark, so an interrupted run resumes where it
+stopped and rows are never counted twice.
+
+Ids are handed out when a row is inserted, not when its transaction
+commits, so the watermark can pass a row that is still being written. The
+ids it skips are kept in RecommendationGap and looked up again at the
+start of every run, for BOUGHT_TOGETHER_LATE_HOURS; a gap found there is
+counted then, exactly once.
+
+Product pages then read their recommendations with bought_together(): one
+indexed query, no aggregation over the order history.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from store.models import Product
+from .models import BoughtTogether, OrderProduct, ProductPairCount, RecommendationGap, RecommendationState
+
+
+# Product ids per top-K query; keeps the parameter count under SQLite's limit.
+REFRESH_CHUNK_SIZE = 500
+
+
+def _state():
+    state, _ = RecommendationState.objects.select_for_update().get_or_create(pk=1)
+    return state
+
+
+def _new_pairs(rows, watermark):
+    """Pair deltas for the new OrderProduct rows, given as (order_id, product_id)"""
+    new_products = defaultdict(set)
+    for order_id, product_id in rows:
+        new_products[order_id].add(product_id)
+
+    # The rows of the same orders counted before: below the watermark and not a gap.
+    old_products = defaultdict(set)
+    for order_id, product_id in (OrderProduct.objects
+                                 .filter(order_id__in=new_products, id__lte=watermark, ordered=True)
+                                 .exclude(id__in=RecommendationGap.objects.values('order_product_id'))
+                                 .values_list('order_id', 'product_id')):
+        old_products[order_id].add(product_id)
+
+    pairs = Counter()
+    for order_id, products in new_products.items():
+        old = old_products[order_id]
+        new = sorted(products - old)
+        for i, product_id in enumerate(new):
+            for other in list(old) + new[i + 1:]:
+                pairs[(product_id, other)] += 1
+                pairs[(other, product_id)] += 1
+    return pairs
+
+
+def _add_pairs(pairs):
+    if not pairs:
+        return
+    products = {product_id for product_id, _ in pairs}
+    existing = {
+        (pair.product_id, pair.related_id): pair
+        for pair in ProductPairCount.objects.filter(product_id__in=products, related_id__in={r for _, r in pairs})
+    }
+    changed, created = [], []
+    for key, count in pairs.items():
+        pair = existing.get(key)
+        if pair is None:
+            created.append(ProductPairCount(product_id=key[0], related_id=key[1], count=count))
+        else:
+            pair.count += count
+            changed.append(pair)
+    ProductPairCount.objects.bulk_update(changed, ['count'], batch_size=500)
+    ProductPairCount.objects.bulk_create(created, batch_size=500)
+
+
+def refresh_top(product_ids):
+    """Rewrite the BoughtTogether rows of the given products from their pair counts"""
+    product_ids = list(product_ids)
+    table = ProductPairCount._meta.db_table
+    rows = []
+    for start in range(0, len(product_ids), REFRESH_CHUNK_SIZE):
+        chunk = product_ids[start:start + REFRESH_CHUNK_SIZE]
+        # The top K of every product in the chunk in one query.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT product_id, related_id, count, rank FROM ('
+                'SELECT product_id, related_id, count, ROW_NUMBER() OVER '
+                '(PARTITION BY product_id ORDER BY count DESC, related_id) - 1 AS rank '
+                'FROM %s WHERE product_id IN (%s)) ranked WHERE rank < %%s'
+                % (table, ', '.join(['%s'] * len(chunk))),
+                chunk + [settings.BOUGHT_TOGETHER_TOP_K],
+            )
+            rows.extend(
+                BoughtTogether(product_id=product_id, related_id=related_id, rank=rank, count=count)
+                for product_id, related_id, count, rank in cursor.fetchall()
+            )
+    BoughtTogether.objects.filter(product_id__in=product_ids).delete()
+    BoughtTogether.objects.bulk_create(rows, batch_size=500)
+
+
+def _count(rows, watermark):
+    """Add the pairs of `rows`, (order_id, product_id), and refresh the products they touch"""
+    pairs = _new_pairs(rows, watermark)
+    _add_pairs(pairs)
+    refresh_top(sorted({product_id for product_id, _ in pairs}))
+
+
+def count_late_rows():
+    """Count the gaps that have been committed since; returns the number of rows read"""
+    with transaction.atomic():
+        state = _state()
+        gaps = RecommendationGap.objects.values('order_product_id')
+        rows = list(OrderProduct.objects.filter(id__in=gaps, ordered=True).values_list('id', 'order_id', 'product_id'))
+        if rows:
+            _count([(order_id, product_id) for _, order_id, product_id in rows], state.last_order_product_id)
+            RecommendationGap.objects.filter(order_product_id__in=[pk for pk, _, _ in rows]).delete()
+        cutoff = timezone.now() - timedelta(hours=settings.BOUGHT_TOGETHER_LATE_HOURS)
+        RecommendationGap.objects.filter(created_at__lt=cutoff).delete()
+    return len(rows)
+
+
+def update(batch_size=1000, stdout=None):
+    """Count the OrderProduct rows added since the last run; returns the number of rows read"""
+    processed = count_late_rows()
+    if stdout and processed:
+        stdout.write(f'  Read {processed} late order lines')
+    while True:
+        with transaction.atomic():
+            state = _state()
+            watermark = state.last_order_product_id
+            rows = list(OrderProduct.objects
+                        .filter(id__gt=watermark, ordered=True)
+                        .order_by('id').values_list('id', 'order_id', 'product_id')[:batch_size])
+            if not rows:
+                return processed
+            _count([(order_id, product_id) for _, order_id, product_id in rows], watermark)
+            # Ids the watermark now moves past without having seen them.
+            seen = {pk for pk, _, _ in rows}
+            RecommendationGap.objects.bulk_create(
+                [RecommendationGap(order_product_id=pk) for pk in range(watermark + 1, rows[-1][0]) if pk not in seen],
+                batch_size=500,
+            )
+            state.last_order_product_id = rows[-1][0]
+            state.save()
+        processed += len(rows)
+        if stdout:
+            stdout.write(f'  Read {processed} order lines')
+
+
+def reset():
+    """Forget all counts so the next update() starts from the first order"""
+    with transaction.atomic():
+        BoughtTogether.objects.all().delete()
+        ProductPairCount.objects.all().delete()
+        RecommendationGap.objects.all().delete()
+        RecommendationState.objects.all().delete()
+
+
+def bought_together(product, limit=None):
+    """Available products most often bought with `product`, best first"""
+    limit = limit or settings.BOUGHT_TOGETHER_SIZE
+    return list(Product.objects
+                .filter(bought_with__product=product, is_available=True)
+                .select_related('category')
+                .order_by('bought_with__rank')[:limit])
@@ -1,3 +1,74 @@
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import Account
+from category.models import Category
+from store.models import Product
+from . import recommendations
+from .models import BoughtTogether, Order, OrderProduct, ProductPairCount, RecommendationGap
+
+
+class BoughtTogetherTests(TestCase):
+
+    def setUp(self):
+        self.user = Account.objects.create_user(
+            first_name='Test', last_name='Buyer', username='buyer', email='buyer@example.com', password='secret',
+        )
+        category = Category.objects.create(category_name='Shirts', slug='shirts')
+        self.shirt, self.hat, self.scarf = [
+            Product.objects.create(
+                product_name=name, slug=name.lower(), price=10, stock=5, category=category,
+                images='photos/products/%s.jpg' % name.lower(),
+            )
+            for name in ('Shirt', 'Hat', 'Scarf')
+        ]
+
+    def order(self):
+        return Order.objects.create(
+            user=self.user, order_number='1', first_name='Test', last_name='Buyer', phone='1',
+            email='buyer@example.com', address_line_1='Street', country='X', state='Y', city='Z',
+            order_total=10, tax=0, is_ordered=True,
+        )
+
+    def line(self, order, product, **fields):
+        return OrderProduct.objects.create(
+            order=order, user=self.user, product=product, quantity=1, product_price=10, ordered=True, **fields,
+        )
+
+    def counts(self):
+        return {
+            (pair.product_id, pair.related_id): pair.count for pair in ProductPairCount.objects.all()
+        }
+
+    def test_rows_committed_behind_the_watermark_are_counted_once(self):
+        order = self.order()
+        first = self.line(order, self.shirt)
+        # A row with a lower id that commits after the job ran.
+        late_id = first.pk + 1
+        self.line(order, self.hat, id=late_id + 1)
+
+        self.assertEqual(recommendations.update(), 2)
+        self.assertEqual(self.counts(), {(self.shirt.pk, self.hat.pk): 1, (self.hat.pk, self.shirt.pk): 1})
+        self.assertEqual(list(RecommendationGap.objects.values_list('order_product_id', flat=True)), [late_id])
+
+        self.line(order, self.scarf, id=late_id)
+        self.assertEqual(recommendations.update(), 1)
+        self.assertEqual(recommendations.update(), 0)
+        self.assertEqual(set(self.counts().values()), {1})
+        self.assertEqual(len(self.counts()), 6)
+        self.assertFalse(RecommendationGap.objects.exists())
+
+    def test_refresh_top_ranks_every_product(self):
+        for products in ([self.shirt, self.hat], [self.shirt, self.hat], [self.shirt, self.scarf]):
+            order = self.order()
+            for product in products:
+                self.line(order, product)
+        recommendations.update()
+
+        with self.settings(BOUGHT_TOGETHER_TOP_K=1):
+            with self.assertNumQueries(3):
+                recommendations.refresh_top([self.shirt.pk, self.hat.pk, self.scarf.pk])
+        self.assertEqual(
+            sorted(BoughtTogether.objects.values_list('product', 'related', 'rank', 'count')),
+            sorted([(self.shirt.pk, self.hat.pk, 0, 2), (self.hat.pk, self.shirt.pk, 0, 2),
+                    (self.scarf.pk, self.shirt.pk, 0, 1)]),
+        )
@@ -3,7 +3,8 @@ from .models import Product, Variation
 # Register your models here.
 
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('product_name', 'price', 'stock', 'category', 'modified_date', 'is_available')
+    list_display = ('product_name', 'price', 'stock', 'category', 'modified_date', 'is_available', 'is_featured')
+    list_filter = ('is_featured',)
     prepopulated_fields = {'slug':('product_name',)}
 
 class VariationAdmin(admin.ModelAdmin):
@@ -0,0 +1,292 @@
+"""
+In-memory prefix index behind the navbar search autocomplete.
+
+Every product and category name is stored under each of its word tails
+("blue cotton shirt", "cotton shirt", "shirt") in a sorted list per kind,
+so a prefix lookup is a bisect plus a short forward scan.
+
+The index lives in each process. It is built in a background thread at
+startup (warm(), called from wsgi.py): the rows are
+collected, sorted once, and the finished index swapped in, so lookups
+never wait on a build that replaces an existing index. Changes to what a
+suggestion shows are applied to the index of the process that made them
+right away, and move a version key in the shared cache. Other processes
+read that key at most once per AUTOCOMPLETE_REBUILD_INTERVAL seconds, so a
+warm lookup touches neither the database nor the cache, and rebuild in
+the background when it has moved; they may serve suggestions that are
+that much out of date.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from category.models import Category
+from .models import Product, product_url
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'autocomplete:version'
+
+PRODUCT = 'product'
+CATEGORY = 'category'
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+def word_tails(text):
+    words = normalize(text).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    """Per-kind sorted (key, id) tuples plus the label/url of every indexed object"""
+
+    def __init__(self, max_entries, version=None):
+        self.max_entries = max_entries
+        self.version = version
+        self.built_at = self.checked_at = time.monotonic()
+        self._keys = {CATEGORY: [], PRODUCT: []}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, kind, objects):
+        """
+        Bulk-add (id, label, url) triples to an index that isn't in use yet.
+
+        The keys are sorted once at the end instead of inserted one by one.
+        Returns False if max_entries cut the load short.
+        """
+        keys = self._keys[kind]
+        complete = True
+        for obj_id, label, url in objects:
+            if len(self._entries) >= self.max_entries:
+                complete = False
+                break
+            tails = word_tails(label)
+            self._entries[(kind, obj_id)] = (label, url, tails)
+            keys.extend((key, obj_id) for key in tails)
+        keys.sort()
+        return complete
+
+    def add(self, kind, obj_id, label, url):
+        with self._lock:
+            self._remove(kind, obj_id)
+            if len(self._entries) >= self.max_entries:
+                return False
+            keys = word_tails(label)
+            self._entries[(kind, obj_id)] = (label, url, keys)
+            for key in keys:
+                bisect.insort(self._keys[kind], (key, obj_id))
+            return True
+
+    def remove(self, kind, obj_id):
+        with self._lock:
+            self._remove(kind, obj_id)
+
+    def _remove(self, kind, obj_id):
+        entry = self._entries.pop((kind, obj_id), None)
+        if entry is None:
+            return
+        keys = self._keys[kind]
+        for key in entry[2]:
+            position = bisect.bisect_left(keys, (key, obj_id))
+            if position < len(keys) and keys[position] == (key, obj_id):
+                del keys[position]
+
+    def _scan(self, kind, prefix, limit):
+        keys = self._keys[kind]
+        found = {}
+        position = bisect.bisect_left(keys, (prefix,))
+        while position < len(keys) and len(found) < limit:
+            key, obj_id = keys[position]
+            if not key.startswith(prefix):
+                break
+            found.setdefault(obj_id, self._entries[(kind, obj_id)])
+            position += 1
+        results = [{'type': kind, 'label': label, 'url': url} for label, url, _ in found.values()]
+        return sorted(results, key=lambda result: result['label'].lower())
+
+    def search(self, prefix, limit):
+        """Categories first, then products, each alphabetically"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            results = self._scan(CATEGORY, prefix, limit)
+            return results + self._scan(PRODUCT, prefix, limit - len(results))
+
+
+_index = None
+# Held by the one thread building an index; lookups never wait for it once an index exists.
+_build_lock = threading.Lock()
+# Guards swapping in a rebuilt index against local changes made while it was built.
+_swap_lock = threading.Lock()
+_pending = None
+
+
+def index_version():
+    """Shared index version: a time.time_ns() stamp of the last change"""
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def invalidate():
+    """Tell every process its index is out of date; returns the new version"""
+    version = time.time_ns()
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def build(version=None):
+    """Build a fresh index from the database"""
+    index = PrefixIndex(settings.AUTOCOMPLETE_MAX_ENTRIES, version)
+    index.load(CATEGORY, (
+        (category.pk, category.category_name, category.get_url())
+        for category in Category.objects.only('id', 'category_name', 'slug')
+    ))
+    products = (Product.objects.filter(is_available=True)
+                .select_related('category')
+                .only('id', 'product_name', 'slug', 'category__slug')
+                .order_by('-modified_date'))
+    if not index.load(PRODUCT, (
+        (product.pk, product.product_name, product_url(product.category.slug, product.slug))
+        for product in products.iterator()
+    )):
+        logger.info('Autocomplete index full at %d entries', len(index))
+    return index
+
+
+def _in_background(function, *args):
+    def run():
+        try:
+            function(*args)
+        finally:
+            # The thread's own database connection.
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _rebuild(version):
+    """Build an index and swap it in; the caller holds _build_lock"""
+    global _index, _pending
+    try:
+        with _swap_lock:
+            _pending = []
+        index = build(version if version is not None else index_version())
+        with _swap_lock:
+            # Replay what this process changed while the rows were being read.
+            for apply in _pending:
+                apply(index)
+            _pending = None
+            _index = index
+    except Exception:
+        logger.exception('Autocomplete index build failed')
+    finally:
+        _pending = None
+        _build_lock.release()
+
+
+def _start_rebuild(version=None):
+    """Rebuild in a background thread unless a build is already running"""
+    if _build_lock.acquire(blocking=False):
+        _in_background(_rebuild, version)
+
+
+def warm():
+    """Start building this process's index in the background"""
+    if _index is None:
+        _start_rebuild()
+
+
+def get_index():
+    """
+    This process's index.
+
+    The shared version is read at most once per AUTOCOMPLETE_REBUILD_INTERVAL;
+    when it has moved, the old index keeps answering while a new one is
+    built in the background. Only a process without any index builds inline.
+    """
+    global _index
+    index = _index
+    if index is None:
+        with _build_lock:
+            if _index is None:
+                _index = build(index_version())
+        return _index
+    now = time.monotonic()
+    if now - index.checked_at >= settings.AUTOCOMPLETE_REBUILD_INTERVAL:
+        index.checked_at = now
+        version = index_version()
+        if version != index.version:
+            _start_rebuild(version)
+    return index
+
+
+def suggest(prefix, limit=None):
+    return get_index().search(prefix, limit or settings.AUTOCOMPLETE_LIMIT)
+
+
+def _apply(apply):
+    """Apply a change to this process's index, and to one being built"""
+    with _swap_lock:
+        if _index is not None:
+            apply(_index)
+        if _pending is not None:
+            _pending.append(apply)
+
+
+def _changed():
+    """Move the shared version; this process adopts it if its index had seen every earlier change"""
+    previous = cache.get(VERSION_KEY)
+    version = invalidate()
+    index = _index
+    if index is not None and previous == index.version:
+        index.version = version
+
+
+def update_products(products):
+    """
+    Apply products whose listing changed (name, slug, category or
+    availability) to this process's index and invalidate the others
+    """
+    products = list(products)
+    if not products:
+        return
+
+    def apply(index):
+        for product in products:
+            if product.is_available:
+                index.add(PRODUCT, product.pk, product.product_name, product.get_url())
+            else:
+                index.remove(PRODUCT, product.pk)
+
+    _apply(apply)
+    _changed()
+
+
+def remove_products(product_ids):
+    product_ids = list(product_ids)
+
+    def apply(index):
+        for product_id in product_ids:
+            index.remove(PRODUCT, product_id)
+
+    _apply(apply)
+    _changed()
+
+
+def reset():
+    """Rebuild every index, this process's in the background (category renames move product URLs)"""
+    _start_rebuild(invalidate())
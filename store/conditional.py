@@ -0,0 +1,98 @@
+"""
+Conditional GET for the catalog pages.
+
+Each page gets a validator returning the time its content last changed:
+the newest Product.modified_date of the products it shows (on product
+pages: the product and its bought-together products, plus the last
+refresh of that list), or a later invalidation of the category menu or
+home feed (their cache versions are timestamps).
+catalog_condition() turns that into ETag/Last-Modified handling through
+Django's @condition, so an unchanged page is answered with 304 before the
+view builds querysets or renders a template.
+
+The ETag also covers the visitor: their user id, CSRF cookie and cart
+contents (the navbar cart count, "in cart" on product pages). A bare
+Last-Modified can't tell visitors apart, so it's only sent to anonymous
+visitors without a cart.
+"""
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from carts.views import cart_fingerprint
+from category.menu import menu_version
+from . import feed
+from .models import Product
+
+
+def _from_version(version):
+    """Cache versions are time.time_ns() stamps of the last invalidation"""
+    return datetime.datetime.fromtimestamp(version / 1e9, tz=datetime.timezone.utc)
+
+
+def _newest(*stamps):
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    return max(stamps) if stamps else None
+
+
+def _latest(products):
+    return products.aggregate(latest=Max('modified_date'))['latest']
+
+
+def store_validator(request, category_slug=None):
+    products = Product.objects.all()
+    if category_slug is not None:
+        products = products.filter(category__slug=category_slug)
+    return _newest(_latest(products), _from_version(menu_version()))
+
+
+def product_validator(request, category_slug, product_slug):
+    row = (Product.objects.filter(category__slug=category_slug, slug=product_slug)
+           .annotate(recommended=Max('bought_together__updated_at'),
+                     related=Max('bought_together__related__modified_date'))
+           .values_list('modified_date', 'recommended', 'related').first())
+    if row is None:
+        return None
+    return _newest(*row, _from_version(menu_version()))
+
+
+def home_validator(request):
+    # The feed fragment may be recomputed (e.g. best sellers) once its cache entry expires.
+    period_start = time.time() // settings.HOME_FEED_TIMEOUT * settings.HOME_FEED_TIMEOUT
+    return _newest(
+        _latest(Product.objects.all()),
+        _from_version(feed.feed_version()),
+        _from_version(menu_version()),
+        datetime.datetime.fromtimestamp(period_start, tz=datetime.timezone.utc),
+    )
+
+
+def catalog_condition(validator):
+    """Decorate a catalog view with ETag/Last-Modified built from `validator`"""
+
+    def state(request, *args, **kwargs):
+        # Shared by the etag and last-modified callbacks of one request.
+        if not hasattr(request, '_catalog_validator'):
+            request._catalog_validator = (validator(request, *args, **kwargs), cart_fingerprint(request))
+        return request._catalog_validator
+
+    def etag(request, *args, **kwargs):
+        last_modified, cart = state(request, *args, **kwargs)
+        if last_modified is None:
+            return None
+        user_id = request.user.pk if request.user.is_authenticated else ''
+        csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+        key = '|'.join([last_modified.isoformat(), str(user_id), csrf, cart])
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        last_modified, cart = state(request, *args, **kwargs)
+        if request.user.is_authenticated or cart:
+            return None
+        return last_modified
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
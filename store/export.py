@@ -0,0 +1,197 @@
+"""
+Catalog feed for marketplaces and price-comparison sites.
+
+Products are read with .iterator() and their variations fetched one chunk
+at a time, so an export of any size holds at most `chunk_size` products in
+memory. Each writer yields text pieces suitable for StreamingHttpResponse
+or for writing to a file.
+
+Incremental exports pass `since`: only products modified at or after it
+are emitted (variation changes bump Product.modified_date too). Products
+that become unavailable are exported with availability "out of stock";
+products deleted since then follow as tombstones: only id, slug and
+modified_date (the deletion time) set, availability "deleted". Deletions
+are kept for CATALOG_FEED_TOMBSTONE_DAYS, so a consumer that hasn't synced
+for longer must start again from a full export.
+"""
+import csv
+import datetime
+import itertools
+import json
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import DeletedProduct, Product, Variation
+
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'xml': 'application/xml; charset=utf-8',
+}
+
+FIELDS = [
+    'id', 'slug', 'name', 'description', 'category', 'category_name', 'price', 'stock',
+    'availability', 'url', 'image_url', 'colors', 'sizes', 'modified_date',
+]
+
+
+def last_modified():
+    """
+    Last-Modified of the catalog feed, truncated to whole seconds, or None.
+
+    Changes from the last second are not treated as settled: the value is
+    kept a second behind them so an export that raced a write in the same
+    second is re-sent rather than answered with 304.
+    """
+    candidates = [
+        Product.objects.aggregate(latest=Max('modified_date'))['latest'],
+        DeletedProduct.objects.aggregate(latest=Max('deleted_at'))['latest'],
+    ]
+    candidates = [value for value in candidates if value is not None]
+    if not candidates:
+        return None
+    latest = max(candidates)
+    settled = min(latest, timezone.now() - datetime.timedelta(seconds=1))
+    return settled.replace(microsecond=0)
+
+
+def iter_products(since=None, chunk_size=None):
+    """Yield (product, variations) in id order, fetching variations one chunk at a time"""
+    chunk_size = chunk_size or settings.CATALOG_FEED_CHUNK_SIZE
+    products = Product.objects.select_related('category').order_by('id')
+    if since is not None:
+        products = products.filter(modified_date__gte=since)
+
+    chunk = []
+    for product in products.iterator(chunk_size=chunk_size):
+        chunk.append(product)
+        if len(chunk) >= chunk_size:
+            yield from _with_variations(chunk)
+            chunk = []
+    yield from _with_variations(chunk)
+
+
+def record_deletions(products):
+    """Keep tombstones of deleted products for incremental feeds, dropping expired ones"""
+    cutoff = timezone.now() - datetime.timedelta(days=settings.CATALOG_FEED_TOMBSTONE_DAYS)
+    DeletedProduct.objects.filter(deleted_at__lt=cutoff).delete()
+    DeletedProduct.objects.bulk_create(
+        [DeletedProduct(product_id=product.pk, slug=product.slug) for product in products],
+        ignore_conflicts=True,
+    )
+
+
+def iter_deletions(since):
+    """Tombstones of the products deleted at or after `since`, in id order"""
+    return DeletedProduct.objects.filter(deleted_at__gte=since).order_by('product_id').iterator()
+
+
+def _with_variations(products):
+    if not products:
+        return
+    variations = {}
+    for variation in (Variation.objects.filter(product_id__in=[p.pk for p in products], is_active=True)
+                      .order_by('id').only('product_id', 'variation_category', 'variation_value')):
+        variations.setdefault(variation.product_id, []).append(variation)
+    for product in products:
+        yield product, variations.get(product.pk, [])
+
+
+def _absolute(base_url, path):
+    return base_url.rstrip('/') + path if base_url else path
+
+
+def product_record(product, variations, base_url=''):
+    """One feed entry as a dict of FIELDS"""
+    values = {'color': [], 'size': []}
+    for variation in variations:
+        values.setdefault(variation.variation_category, []).append(variation.variation_value)
+    available = product.is_available and product.stock > 0
+    return {
+        'id': product.pk,
+        'slug': product.slug,
+        'name': product.product_name,
+        'description': product.description,
+        'category': product.category.slug,
+        'category_name': product.category.category_name,
+        'price': str(product.price),
+        'stock': product.stock,
+        'availability': 'in stock' if available else 'out of stock',
+        'url': _absolute(base_url, product.get_url()),
+        'image_url': _absolute(base_url, product.images.url) if product.images else '',
+        'colors': values['color'],
+        'sizes': values['size'],
+        'modified_date': product.modified_date.isoformat(),
+    }
+
+
+def tombstone_record(deleted):
+    """Feed entry of a deleted product: only id, slug and the deletion time are set"""
+    record = {field: '' for field in FIELDS}
+    record.update(
+        id=deleted.product_id,
+        slug=deleted.slug,
+        availability='deleted',
+        colors=[],
+        sizes=[],
+        modified_date=deleted.deleted_at.isoformat(),
+    )
+    return record
+
+
+class _Echo:
+    """File-like object whose write() returns the text, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def write_csv(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for record in records:
+        row = dict(record, colors='|'.join(record['colors']), sizes='|'.join(record['sizes']))
+        yield writer.writerow([row[field] for field in FIELDS])
+
+
+def write_jsonl(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def write_xml(records):
+    yield '<?xml version="1.0" encoding="utf-8"?>\n<catalog>\n'
+    for record in records:
+        parts = ['  <product id=%s>\n' % quoteattr(str(record['id']))]
+        for field in FIELDS[1:]:
+            value = record[field]
+            if isinstance(value, list):
+                singular = field[:-1]
+                parts.extend('    <%s>%s</%s>\n' % (singular, escape(v), singular) for v in value)
+            else:
+                parts.append('    <%s>%s</%s>\n' % (field, escape(str(value)), field))
+        parts.append('  </product>\n')
+        yield ''.join(parts)
+    yield '</catalog>\n'
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'xml': write_xml,
+}
+
+
+def generate_feed(feed_format, since=None, base_url='', chunk_size=None):
+    """Text pieces of the whole feed in `feed_format`; incremental feeds end with the tombstones"""
+    records = (
+        product_record(product, variations, base_url)
+        for product, variations in iter_products(since, chunk_size)
+    )
+    if since is not None:
+        records = itertools.chain(records, (tombstone_record(deleted) for deleted in iter_deletions(since)))
+    return WRITERS[feed_format](records)
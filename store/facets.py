@@ -0,0 +1,143 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Product, ProductFacet, Variation
+
+
+FACETS = [name for name, _ in ProductFacet.FACET_CHOICES]
+FACET_TITLES = dict(ProductFacet.FACET_CHOICES)
+AVAILABILITY_LABELS = {'in_stock': 'In stock', 'out_of_stock': 'Out of stock'}
+
+
+def price_bucket(price):
+    """Name of the STORE_PRICE_BUCKETS band a price falls in, e.g. '50-100' or '2000+'"""
+    bounds = settings.STORE_PRICE_BUCKETS
+    for low, high in zip(bounds, bounds[1:]):
+        if price < high:
+            return f'{low}-{high}'
+    return f'{bounds[-1]}+'
+
+
+def bucket_label(value):
+    if value.endswith('+'):
+        return f'${value[:-1]}+'
+    low, high = value.split('-')
+    return f'${low} - ${high}'
+
+
+def _bucket_start(value):
+    return Decimal(value.rstrip('+').split('-')[0])
+
+
+def _facet_rows(product, variations):
+    rows = {
+        ('price', price_bucket(product.price)),
+        ('availability', 'in_stock' if product.stock > 0 else 'out_of_stock'),
+    }
+    for variation in variations:
+        if variation.variation_category in ('color', 'size'):
+            rows.add((variation.variation_category, variation.variation_value[:100]))
+    return [
+        ProductFacet(product_id=product.pk, category_id=product.category_id, facet=facet, value=value)
+        for facet, value in rows
+    ]
+
+
+def index_products(product_ids):
+    """Recompute the facet rows of the given products; unavailable products get none"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    products = Product.objects.filter(pk__in=product_ids, is_available=True).only(
+        'id', 'category_id', 'price', 'stock'
+    )
+    variations = {}
+    for variation in Variation.objects.filter(product_id__in=product_ids, is_active=True).only(
+        'product_id', 'variation_category', 'variation_value'
+    ):
+        variations.setdefault(variation.product_id, []).append(variation)
+
+    rows = [row for product in products for row in _facet_rows(product, variations.get(product.pk, ()))]
+    with transaction.atomic():
+        ProductFacet.objects.filter(product_id__in=product_ids).delete()
+        ProductFacet.objects.bulk_create(rows, batch_size=500)
+
+
+def rebuild(batch_size=1000, stdout=None):
+    """Rebuild the whole facet table; returns the number of products indexed"""
+    indexed = 0
+    with transaction.atomic():
+        ProductFacet.objects.all().delete()
+        ids = Product.objects.filter(is_available=True).order_by('id').values_list('id', flat=True)
+        batch = []
+        for pk in ids.iterator(chunk_size=batch_size):
+            batch.append(pk)
+            if len(batch) >= batch_size:
+                index_products(batch)
+                indexed += len(batch)
+                batch = []
+                if stdout:
+                    stdout.write(f'  Indexed facets of {indexed} products')
+        index_products(batch)
+        indexed += len(batch)
+    return indexed
+
+
+def parse_filters(params):
+    """Selected facet values from a QueryDict, e.g. {'size': ['M', 'L']}"""
+    return {
+        facet: values
+        for facet, values in ((facet, [v for v in params.getlist(facet) if v]) for facet in FACETS)
+        if values
+    }
+
+
+def _matching_ids(facet, values):
+    return ProductFacet.objects.filter(facet=facet, value__in=values).values('product_id')
+
+
+def filter_products(products, filters):
+    """Narrow a Product queryset to the products matching every selected facet"""
+    for facet, values in filters.items():
+        products = products.filter(id__in=_matching_ids(facet, values))
+    return products
+
+
+def facet_counts(filters, category=None):
+    """
+    Sidebar facets with counts, one GROUP BY on the facet table per facet.
+
+    Each facet is counted under the filters of the *other* facets, so picking
+    one size still shows how many products every other size would give.
+    """
+    facets = []
+    for facet in FACETS:
+        rows = ProductFacet.objects.filter(facet=facet)
+        if category is not None:
+            rows = rows.filter(category=category)
+        for other, values in filters.items():
+            if other != facet:
+                rows = rows.filter(product_id__in=_matching_ids(other, values))
+        counts = rows.values('value').annotate(count=Count('id')).order_by()
+
+        selected = set(filters.get(facet, ()))
+        options = []
+        for row in counts:
+            value = row['value']
+            if facet == 'price':
+                label = bucket_label(value)
+            elif facet == 'availability':
+                label = AVAILABILITY_LABELS.get(value, value)
+            else:
+                label = value
+            options.append({'value': value, 'label': label, 'count': row['count'], 'selected': value in selected})
+        if facet == 'price':
+            options.sort(key=lambda option: _bucket_start(option['value']))
+        else:
+            options.sort(key=lambda option: option['label'])
+        if options:
+            facets.append({'name': facet, 'title': FACET_TITLES[facet], 'options': options})
+    return facets
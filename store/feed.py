@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import Product
+
+
+VERSION_KEY = 'home_feed:version'
+
+STRATEGIES = {}
+
+
+def strategy(name):
+    """Register a function returning up to `size` ordered product ids"""
+    def register(func):
+        STRATEGIES[name] = func
+        return func
+    return register
+
+
+def _available():
+    return Product.objects.filter(is_available=True)
+
+
+@strategy('newest')
+def newest(size, exclude=()):
+    products = _available().exclude(id__in=exclude).order_by('-created_date', '-id')
+    return list(products.values_list('id', flat=True)[:size])
+
+
+@strategy('featured')
+def featured(size):
+    ids = list(_available().filter(is_featured=True).order_by('-modified_date', '-id').values_list('id', flat=True)[:size])
+    return ids + newest(size - len(ids), exclude=ids) if len(ids) < size else ids
+
+
+@strategy('best_selling')
+def best_selling(size):
+    from orders.models import OrderProduct
+
+    ids = list(
+        OrderProduct.objects.filter(ordered=True, product__is_available=True)
+        .values('product_id')
+        .annotate(sold=Sum('quantity'))
+        .order_by('-sold', 'product_id')
+        .values_list('product_id', flat=True)[:size]
+    )
+    return ids + newest(size - len(ids), exclude=ids) if len(ids) < size else ids
+
+
+def feed_version():
+    """Current feed version; part of every feed cache key"""
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def invalidate():
+    """Drop every cached id list and rendered fragment by moving to a new version"""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def get_feed_ids(strategy=None, size=None):
+    strategy = strategy or settings.HOME_FEED_STRATEGY
+    size = size or settings.HOME_FEED_SIZE
+    key = 'home_feed:ids:%s:%s:%s' % (feed_version(), strategy, size)
+    ids = cache.get(key)
+    if ids is None:
+        ids = STRATEGIES[strategy](size)
+        cache.set(key, ids, settings.HOME_FEED_TIMEOUT)
+    return ids
+
+
+def get_feed_products(strategy=None, size=None):
+    """Feed products in feed order, fetched in one query"""
+    ids = get_feed_ids(strategy, size)
+    products = Product.objects.select_related('category').in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
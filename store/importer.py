@@ -0,0 +1,326 @@
+"""
+Bulk product import from supplier catalogs.
+
+Rows are read lazily from CSV or JSONL and written in batches: one
+transaction per batch, bulk_create/bulk_update for products and
+variations, and the bookkeeping that Product signals do per save (search
+index, category counters, facets, home feed) done once
+for the whole batch. Memory use is bounded by the batch size.
+
+Recognised columns: product_name, slug, description, price, stock,
+is_available, is_featured, category (slug), images, color, size. In CSV
+files several colors/sizes are separated by "|"; in JSONL they may also be
+lists. A row whose slug matches an existing product updates it; rows
+without a slug create new products under a slug generated from the name.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from category import counters
+from category.models import Category
+from . import autocomplete, facets, feed, search
+from .models import Product, Variation, variation_category_choice
+
+
+PRODUCT_FIELDS = ['product_name', 'description', 'price', 'stock', 'is_available', 'is_featured', 'category', 'images']
+VARIATION_CATEGORIES = [choice for choice, _ in variation_category_choice]
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+SLUG_MAX_LENGTH = Product._meta.get_field('slug').max_length
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_csv(stream):
+    """Yield (line number, row dict) from a CSV file with a header row; empty cells are left out"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {key.strip(): value for key, value in row.items() if key and value}
+
+
+def read_jsonl(stream):
+    """Yield (line number, row dict) from a file of one JSON object per line"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f'invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError('expected a JSON object')
+            continue
+        yield line_number, row
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _bool(value, name):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f'{name} must be true or false, got {value!r}')
+
+
+def _values(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        values = [_text(v) for v in value]
+    else:
+        values = _text(value).split('|')
+    return [v[:100] for v in values if v]
+
+
+def clean_row(row, category_ids):
+    """Validate one input row into {field: value}; only the columns present are returned"""
+    cleaned = {}
+    for name in ('product_name', 'description', 'images'):
+        if row.get(name) is not None:
+            cleaned[name] = _text(row[name])
+    if row.get('price') not in (None, ''):
+        try:
+            cleaned['price'] = Decimal(_text(row['price'])).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise RowError(f'invalid price {row["price"]!r}')
+    if row.get('stock') not in (None, ''):
+        try:
+            cleaned['stock'] = int(_text(row['stock']))
+        except ValueError:
+            raise RowError(f'invalid stock {row["stock"]!r}')
+    for name in ('is_available', 'is_featured'):
+        if row.get(name) is not None:
+            cleaned[name] = _bool(row[name], name)
+    if row.get('category') not in (None, ''):
+        slug = _text(row['category'])
+        if slug not in category_ids:
+            raise RowError(f'unknown category {slug!r}')
+        cleaned['category_id'] = category_ids[slug]
+    for name in VARIATION_CATEGORIES:
+        values = _values(row.get(name))
+        if values is not None:
+            cleaned.setdefault('variations', {})[name] = values
+    slug = _text(row.get('slug'))
+    if slug:
+        # Product URLs only match slugs of letters, digits, "-" and "_".
+        try:
+            validate_slug(slug)
+        except ValidationError:
+            raise RowError(f'invalid slug {slug!r}: use only letters, numbers, underscores or hyphens')
+        if len(slug) > SLUG_MAX_LENGTH:
+            raise RowError(f'slug is longer than {SLUG_MAX_LENGTH} characters')
+        cleaned['slug'] = slug
+    if 'product_name' in cleaned and not cleaned['product_name']:
+        raise RowError('product_name is empty')
+    return cleaned
+
+
+def unique_slugs(names, reserved=()):
+    """
+    Slugs for new products named `names` (two queries).
+
+    They are unique against the table, each other and `reserved`: the
+    explicit slugs of the other rows in the same batch.
+    """
+    bases = [slugify(name)[:SLUG_MAX_LENGTH - 8] or 'product' for name in names]
+    distinct = set(bases)
+    taken = set(Product.objects.filter(slug__in=distinct).values_list('slug', flat=True)) | set(reserved)
+    clashing = distinct & taken
+    if clashing:
+        prefixes = Q()
+        for base in clashing:
+            prefixes |= Q(slug__startswith=base + '-')
+        taken.update(Product.objects.filter(prefixes).values_list('slug', flat=True))
+
+    slugs = []
+    for base in bases:
+        slug, n = base, 1
+        while slug in taken:
+            n += 1
+            slug = f'{base}-{n}'
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def _listing(product):
+    """What an autocomplete suggestion shows of a product"""
+    return product.product_name, product.slug, product.category_id, product.is_available
+
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+
+
+class ProductImporter:
+    """
+    Write parsed rows to the catalog batch by batch.
+
+    Errors in a row skip just that row and are passed to `on_error(line,
+    message)`; `on_batch(stats)` is called after every committed batch.
+    """
+
+    def __init__(self, batch_size=1000, on_error=None, on_batch=None):
+        self.batch_size = batch_size
+        self.on_error = on_error or (lambda line, message: None)
+        self.on_batch = on_batch or (lambda stats: None)
+        self.stats = ImportStats()
+        self.category_ids = dict(Category.objects.values_list('slug', 'id'))
+
+    def run(self, rows):
+        batch = []
+        for line, row in rows:
+            self.stats.rows += 1
+            if isinstance(row, RowError):
+                self._skip(line, row)
+                continue
+            try:
+                batch.append((line, clean_row(row, self.category_ids)))
+            except RowError as e:
+                self._skip(line, e)
+                continue
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.stats
+
+    def _skip(self, line, error):
+        self.stats.skipped += 1
+        self.on_error(line, str(error))
+
+    def import_batch(self, batch):
+        with transaction.atomic():
+            existing = Product.objects.in_bulk(
+                [row['slug'] for _, row in batch if 'slug' in row], field_name='slug'
+            )
+            old_contributions = {
+                product.pk: counters.product_contribution(product.category_id, product.is_available, product.stock)
+                for product in existing.values()
+            }
+            old_listings = {product.pk: _listing(product) for product in existing.values()}
+
+            new_rows, pending, updated, variations = [], {}, {}, []
+            for line, row in batch:
+                slug = row.get('slug')
+                product = existing.get(slug) or pending.get(slug)
+                if product is None:
+                    missing = [name for name in ('product_name', 'price', 'stock', 'category_id') if name not in row]
+                    if missing:
+                        self._skip(line, 'new product is missing ' + ', '.join(missing))
+                        continue
+                    product = Product()
+                    new_rows.append((product, row))
+                    if slug:
+                        pending[slug] = product
+                elif product.pk is not None:
+                    updated[product.pk] = product
+                for name, value in row.items():
+                    if name not in ('slug', 'variations'):
+                        setattr(product, name, value)
+                if 'variations' in row:
+                    variations.append((product, row['variations']))
+
+            generated = iter(unique_slugs(
+                [p.product_name for p, row in new_rows if 'slug' not in row],
+                reserved=[row['slug'] for _, row in batch if 'slug' in row],
+            ))
+            for product, row in new_rows:
+                product.slug = row['slug'] if 'slug' in row else next(generated)
+            created = [product for product, _ in new_rows]
+            Product.objects.bulk_create(created, batch_size=500)
+            if any(product.pk is None for product in created):
+                # Backends that don't return ids from bulk inserts (SQLite before Django 4.0).
+                ids = dict(Product.objects.filter(slug__in=[p.slug for p in created]).values_list('slug', 'id'))
+                for product in created:
+                    product.pk = ids[product.slug]
+
+            if updated:
+                # bulk_update() skips auto_now.
+                now = timezone.now()
+                for product in updated.values():
+                    product.modified_date = now
+                Product.objects.bulk_update(
+                    updated.values(), PRODUCT_FIELDS + ['modified_date'], batch_size=500
+                )
+
+            self._sync_variations(variations)
+            products = created + list(updated.values())
+            self._after_save(products, old_contributions, old_listings)
+
+        self.stats.created += len(created)
+        self.stats.updated += len(updated)
+        self.on_batch(self.stats)
+
+    def _sync_variations(self, variations):
+        """Make each product's active variations exactly the imported ones"""
+        if not variations:
+            return
+        wanted = {
+            (product.pk, category, value)
+            for product, groups in variations
+            for category, values in groups.items()
+            for value in values
+        }
+        imported_categories = {(product.pk, category) for product, groups in variations for category in groups}
+        current = Variation.objects.filter(product_id__in={product.pk for product, _ in variations})
+
+        changed, seen = [], set()
+        for variation in current:
+            key = (variation.product_id, variation.variation_category, variation.variation_value)
+            if (variation.product_id, variation.variation_category) not in imported_categories:
+                continue
+            # Deactivate rather than delete: cart items may still point at the variation.
+            is_active = key in wanted and key not in seen
+            seen.add(key)
+            if variation.is_active != is_active:
+                variation.is_active = is_active
+                changed.append(variation)
+        Variation.objects.bulk_update(changed, ['is_active'], batch_size=500)
+        Variation.objects.bulk_create(
+            [Variation(product_id=pk, variation_category=category, variation_value=value)
+             for pk, category, value in wanted - seen],
+            batch_size=500,
+        )
+
+    def _after_save(self, products, old_contributions, old_listings):
+        """The per-product post_save work of store.signals, once for the batch"""
+        counters.apply_changes(
+            (old_contributions.get(product.pk),
+             counters.product_contribution(product.category_id, product.is_available, product.stock))
+            for product in products
+        )
+        search.index_products(products)
+        facets.index_products([product.pk for product in products])
+        transaction.on_commit(feed.invalidate)
+        listed = [product for product in products if _listing(product) != old_listings.get(product.pk)]
+        transaction.on_commit(lambda: autocomplete.update_products(listed))
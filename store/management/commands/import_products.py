@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.importer import READERS, ProductImporter
+
+
+class Command(BaseCommand):
+    help = 'Import or update products from a CSV or JSONL catalog file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file, or - to read from stdin')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='Input format; defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows written per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if input_format not in READERS:
+            raise CommandError('Cannot tell the input format; pass --format csv or --format jsonl')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        started = time.monotonic()
+
+        def on_error(line, message):
+            self.stderr.write(f'  Skipped line {line}: {message}')
+
+        def on_batch(stats):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  {stats.rows} rows ({stats.rows / max(elapsed, 0.001):.0f} rows/sec)')
+
+        importer = ProductImporter(options['batch_size'], on_error=on_error, on_batch=on_batch)
+        self.stdout.write(f'Importing products from {path}...')
+        if path == '-':
+            stats = importer.run(READERS[input_format](sys.stdin))
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8')
+            except OSError as e:
+                raise CommandError(e)
+            with stream:
+                stats = importer.run(READERS[input_format](stream))
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully imported {stats.rows} rows in {elapsed:.1f}s '
+            f'({stats.rows / max(elapsed, 0.001):.0f} rows/sec): '
+            f'{stats.created} created, {stats.updated} updated, {stats.skipped} skipped'
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of products indexed per batch')
+
+    def handle(self, *args, **options):
+        backend = 'FTS5' if search.fts5_available() else 'token table'
+        self.stdout.write(f'Rebuilding search index ({backend})...')
+
+        started = time.monotonic()
+        indexed = search.rebuild_index(batch_size=options['batch_size'], stdout=self.stdout)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully indexed {indexed} products in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,54 @@
+# Generated by Django 3.1 on 2026-10-17 18:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.utils import OperationalError
+
+
+def create_fts_table(apps, schema_editor):
+    """Create the FTS5 index on SQLite builds that ship the extension"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts "
+                "USING fts5(product_name, description, tokenize='unicode61')"
+            )
+        except OperationalError:
+            # No FTS5 support; the ProductSearchToken table is used instead.
+            return
+        cursor.execute(
+            "INSERT INTO store_product_fts (rowid, product_name, description) "
+            "SELECT id, product_name, description FROM store_product"
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS store_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_variation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.product')),
+            ],
+            options={
+                'unique_together': {('token', 'product')},
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
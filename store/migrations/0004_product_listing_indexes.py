@@ -0,0 +1,21 @@
+# Generated by Django 3.1 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_productsearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_available', 'id'], name='store_produ_is_avai_3b717a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'is_available', 'id'], name='store_produ_categor_88d582_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1 on 2026-10-17 18:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0003_category_product_counters'),
+        ('store', '0005_product_is_featured'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('color', 'Color'), ('size', 'Size'), ('price', 'Price range'), ('availability', 'Availability')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='category.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productfacet',
+            index=models.Index(fields=['facet', 'value', 'product'], name='store_produ_facet_9358fb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productfacet',
+            index=models.Index(fields=['category', 'facet', 'value'], name='store_produ_categor_e1c656_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productfacet',
+            unique_together={('product', 'facet', 'value')},
+        ),
+    ]
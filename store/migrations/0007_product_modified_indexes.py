@@ -0,0 +1,21 @@
+# Generated by Django 3.1 on 2026-10-17 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_productfacet'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['modified_date'], name='store_produ_modifie_db386b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'modified_date'], name='store_produ_categor_64416d_idx'),
+        ),
+    ]
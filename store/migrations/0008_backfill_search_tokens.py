@@ -0,0 +1,42 @@
+# Generated by Django 3.1 on 2026-10-17 19:20
+
+from django.db import migrations
+
+from store.search import DESCRIPTION_WEIGHT, FTS_TABLE, NAME_WEIGHT, tokenize
+
+
+def backfill_search_tokens(apps, schema_editor):
+    """Index existing products in ProductSearchToken on databases without the FTS5 table"""
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        return
+    Product = apps.get_model('store', 'Product')
+    ProductSearchToken = apps.get_model('store', 'ProductSearchToken')
+    max_length = ProductSearchToken._meta.get_field('token').max_length
+    ProductSearchToken.objects.all().delete()
+    rows = []
+    for product in Product.objects.only('id', 'product_name', 'description').order_by('id').iterator(chunk_size=1000):
+        weights = {}
+        for token in tokenize(product.product_name):
+            weights[token] = weights.get(token, 0) + NAME_WEIGHT
+        for token in tokenize(product.description):
+            weights[token] = weights.get(token, 0) + DESCRIPTION_WEIGHT
+        rows.extend(
+            ProductSearchToken(product_id=product.pk, token=token[:max_length], weight=weight)
+            for token, weight in weights.items()
+        )
+        if len(rows) >= 5000:
+            ProductSearchToken.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+            rows = []
+    ProductSearchToken.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_product_modified_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+    ]
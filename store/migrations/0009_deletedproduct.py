@@ -0,0 +1,21 @@
+# Generated by Django 3.1 on 2026-10-17 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_backfill_search_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedProduct',
+            fields=[
+                ('product_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('slug', models.SlugField(db_index=False, max_length=200)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
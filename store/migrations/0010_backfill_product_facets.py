@@ -0,0 +1,54 @@
+# Generated by Django 3.1 on 2026-10-17 19:40
+
+from django.db import migrations
+
+from store.facets import price_bucket
+
+
+def backfill_product_facets(apps, schema_editor):
+    """Facet rows for the available products that existed before ProductFacet (as store.facets writes them)"""
+    Product = apps.get_model('store', 'Product')
+    Variation = apps.get_model('store', 'Variation')
+    ProductFacet = apps.get_model('store', 'ProductFacet')
+    ProductFacet.objects.all().delete()
+    products = Product.objects.filter(is_available=True).only('id', 'category_id', 'price', 'stock').order_by('id')
+    batch = []
+    for product in products.iterator(chunk_size=1000):
+        batch.append(product)
+        if len(batch) >= 1000:
+            _index(batch, Variation, ProductFacet)
+            batch = []
+    _index(batch, Variation, ProductFacet)
+
+
+def _index(products, Variation, ProductFacet):
+    if not products:
+        return
+    variations = {}
+    for product_id, category, value in (Variation.objects
+                                        .filter(product_id__in=[p.pk for p in products], is_active=True,
+                                                variation_category__in=('color', 'size'))
+                                        .values_list('product_id', 'variation_category', 'variation_value')):
+        variations.setdefault(product_id, set()).add((category, value[:100]))
+    rows = []
+    for product in products:
+        values = {
+            ('price', price_bucket(product.price)),
+            ('availability', 'in_stock' if product.stock > 0 else 'out_of_stock'),
+        } | variations.get(product.pk, set())
+        rows.extend(
+            ProductFacet(product_id=product.pk, category_id=product.category_id, facet=facet, value=value)
+            for facet, value in values
+        )
+    ProductFacet.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_deletedproduct'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_facets, migrations.RunPython.noop),
+    ]
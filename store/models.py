@@ -1,8 +1,34 @@
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from category.models import Category
 # Create your models here.
 
+_product_url_template = None
+
+
+def product_url(category_slug, product_slug):
+    """reverse('product_detail') without the resolver work on every call"""
+    global _product_url_template
+    if _product_url_template is None:
+        _product_url_template = (
+            reverse('product_detail', args=['__category__', '__product__'])
+            .replace('__category__', '{0}').replace('__product__', '{1}')
+        )
+    return _product_url_template.format(category_slug, product_slug)
+
+
+class ProductManager(models.Manager):
+    def with_detail(self):
+        """Products with their category and active variations loaded in two queries"""
+        return self.select_related('category').prefetch_related(
+            models.Prefetch(
+                'variation_set',
+                queryset=Variation.objects.filter(is_active=True).order_by('variation_category', 'id'),
+                to_attr='active_variations',
+            )
+        )
+
+
 class Product(models.Model):
     product_name = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
@@ -11,13 +37,50 @@ class Product(models.Model):
     images = models.ImageField(upload_to='photos/products', blank=True)
     stock = models.IntegerField()
     is_available = models.BooleanField(default=True)
+    is_featured = models.BooleanField(default=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     created_date = models.DateTimeField(auto_now_add=True)
     modified_date = models.DateTimeField(auto_now=True)
 
+    objects = ProductManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_available', 'id']),
+            models.Index(fields=['category', 'is_available', 'id']),
+            # Page validators and incremental feeds read max(modified_date).
+            models.Index(fields=['modified_date']),
+            models.Index(fields=['category', 'modified_date']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so signal handlers can tell what changed.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save inside a transaction so post_save bookkeeping commits with the row"""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def get_url(self):
+        # Listings load the category with select_related('category').
+        return product_url(self.category.slug, self.slug)
 
-        return reverse('product_detail', args=[self.category.slug, self.slug])
+    def variation_groups(self):
+        """Active variations as [(variation_category, [variations])], known categories first"""
+        variations = getattr(self, 'active_variations', None)
+        if variations is None:
+            variations = self.variation_set.filter(is_active=True).order_by('variation_category', 'id')
+        groups = {}
+        for variation in variations:
+            groups.setdefault(variation.variation_category, []).append(variation)
+        order = [choice for choice, _ in variation_category_choice]
+        return sorted(groups.items(), key=lambda item: (
+            order.index(item[0]) if item[0] in order else len(order), item[0]
+        ))
 
     def __str__(self):
         return self.product_name
@@ -45,4 +108,52 @@ class Variation(models.Model):
     objects=variationManager()
 
     def __unicode__(self):
-        return self.product
\ No newline at end of file
+        return self.product
+
+
+class ProductSearchToken(models.Model):
+    """Inverted index row: one token of a product's name/description and its weight"""
+    token = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = [['token', 'product']]
+
+    def __str__(self):
+        return self.token
+
+
+class ProductFacet(models.Model):
+    """Precomputed facet value of an available product, maintained by store.facets"""
+    FACET_CHOICES = (
+        ('color', 'Color'),
+        ('size', 'Size'),
+        ('price', 'Price range'),
+        ('availability', 'Availability'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = [['product', 'facet', 'value']]
+        indexes = [
+            models.Index(fields=['facet', 'value', 'product']),
+            models.Index(fields=['category', 'facet', 'value']),
+        ]
+
+    def __str__(self):
+        return f'{self.facet}={self.value}'
+
+
+class DeletedProduct(models.Model):
+    """Tombstone of a deleted product, so incremental catalog feeds (store.export) can report it"""
+    product_id = models.IntegerField(primary_key=True)
+    slug = models.SlugField(max_length=200, db_index=False)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.slug
@@ -0,0 +1,146 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder that keeps full microsecond precision on datetimes"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorPage:
+    """One page of a KeysetPaginator, exposing the Page API the templates use"""
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of %d>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by seeking past the last row seen instead of using OFFSET.
+
+    `ordering` must describe a unique key (end it with 'id'), e.g. ('id',) or
+    ('-created_date', '-id'). Every page costs one indexed range scan of
+    per_page + 1 rows, however deep it is. Cursors are opaque URL-safe tokens.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('id',)):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+
+    def encode_cursor(self, obj, direction):
+        values = [getattr(obj, name) for name, _ in self.fields]
+        payload = json.dumps([direction, values], cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return (direction, key values), or (None, None) for a missing or malformed cursor"""
+        if not cursor:
+            return None, None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if direction not in ('next', 'prev') or len(values) != len(self.fields):
+                raise ValueError
+            model = self.object_list.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            return None, None
+        return direction, values
+
+    def _seek(self, values, forward):
+        """Q matching rows strictly after (forward) or before the given key"""
+        condition = Q()
+        for i, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending == forward else 'gt'
+            clause = Q(**{'%s__%s' % (name, lookup): values[i]})
+            for j, (prior_name, _) in enumerate(self.fields[:i]):
+                clause &= Q(**{prior_name: values[j]})
+            condition |= clause
+        return condition
+
+    def get_page(self, cursor=None):
+        direction, values = self.decode_cursor(cursor)
+        queryset = self.object_list
+
+        if direction == 'prev':
+            reverse = [name[1:] if name.startswith('-') else '-' + name for name in self.ordering]
+            rows = list(queryset.filter(self._seek(values, forward=False)).order_by(*reverse)[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            if direction == 'next':
+                queryset = queryset.filter(self._seek(values, forward=True))
+            rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = direction == 'next'
+
+        next_cursor = self.encode_cursor(rows[-1], 'next') if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], 'prev') if rows and has_previous else None
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+def paginate_products(request, products, product_count=None, ordering=('id',)):
+    """
+    Page a product listing, choosing page numbers or cursors.
+
+    Small listings keep the classic ?page=N navigation. Listings with more
+    than STORE_PAGE_NUMBER_LIMIT pages, listings without a known count,
+    and requests carrying a ?cursor= all use keyset paging.
+    """
+    per_page = settings.STORE_PRODUCTS_PER_PAGE
+    small = (
+        product_count is not None
+        and product_count <= per_page * settings.STORE_PAGE_NUMBER_LIMIT
+    )
+    if small and 'cursor' not in request.GET:
+        paginator = Paginator(products.order_by(*ordering), per_page)
+        # The caller already knows the count; don't let the paginator run it again.
+        paginator.count = product_count
+        return paginator.get_page(request.GET.get('page'))
+    return KeysetPaginator(products, per_page, ordering).get_page(request.GET.get('cursor'))
@@ -0,0 +1,210 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+
+from .models import Product, ProductSearchToken
+
+
+FTS_TABLE = 'store_product_fts'
+
+# Relative weight of a token found in the product name vs. the description.
+NAME_WEIGHT = 10
+DESCRIPTION_WEIGHT = 1
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TOKEN_MAX_LENGTH = ProductSearchToken._meta.get_field('token').max_length
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def fts5_available():
+    """
+    True when the FTS5 index table exists on the current database.
+
+    Looked up once per database connection (see reset_fts5()), so a
+    process that outlives a migration or switches databases sees the change.
+    """
+    available = getattr(connection, 'store_fts5_available', None)
+    if available is None:
+        available = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        connection.store_fts5_available = available
+    return available
+
+
+def reset_fts5(connection):
+    """Forget whether `connection` has the FTS5 table; called when it (re)connects"""
+    connection.store_fts5_available = None
+
+
+class RankedResults:
+    """
+    Lazy, sliceable view over a ranked list of product ids.
+
+    Every token matches as a prefix ("shi" finds "shirt"), so results show
+    up while the visitor is still typing.
+
+    Works with django.core.paginator.Paginator: count() runs one query
+    against the index and slicing fetches only the requested page, then
+    loads the matching products in a single query keeping rank order.
+    """
+
+    def __init__(self, backend, tokens):
+        self.backend = backend
+        self.tokens = tokens
+
+    def count(self):
+        if not self.tokens:
+            return 0
+        return self.backend.count(self.tokens)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        if not self.tokens:
+            return []
+        offset = key.start or 0
+        limit = key.stop - offset if key.stop is not None else None
+        ids = self.backend.ranked_ids(self.tokens, offset, limit)
+        products = Product.objects.select_related('category').in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+
+class FTS5Backend:
+    """Full-text index stored in an SQLite FTS5 virtual table, ranked with bm25"""
+
+    def _match(self, tokens):
+        return ' '.join('"%s"*' % token for token in tokens)
+
+    def count(self, tokens):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM %s WHERE %s MATCH %%s' % (FTS_TABLE, FTS_TABLE),
+                [self._match(tokens)],
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, tokens, offset=0, limit=None):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM %s WHERE %s MATCH %%s '
+                'ORDER BY bm25(%s, %d, %d), rowid DESC LIMIT %%s OFFSET %%s'
+                % (FTS_TABLE, FTS_TABLE, FTS_TABLE, NAME_WEIGHT, DESCRIPTION_WEIGHT),
+                [self._match(tokens), -1 if limit is None else limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_products(self, products):
+        rows = [(p.pk, p.product_name, p.description) for p in products]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [(row[0],) for row in rows])
+            cursor.executemany(
+                'INSERT INTO %s (rowid, product_name, description) VALUES (%%s, %%s, %%s)' % FTS_TABLE,
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [(pk,) for pk in product_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % FTS_TABLE)
+
+
+class TokenTableBackend:
+    """Portable inverted index kept in the ProductSearchToken table"""
+
+    def _matches(self, tokens):
+        # A product matches when each token is a prefix of one of its tokens;
+        # its score is the weight of all the tokens that matched.
+        rows = ProductSearchToken.objects.all()
+        matching = Q()
+        for token in {token[:TOKEN_MAX_LENGTH] for token in tokens}:
+            prefix = Q(token__startswith=token)
+            rows = rows.filter(product_id__in=ProductSearchToken.objects.filter(prefix).values('product_id'))
+            matching |= prefix
+        return rows.filter(matching).values('product_id').annotate(score=Sum('weight'))
+
+    def count(self, tokens):
+        return self._matches(tokens).count()
+
+    def ranked_ids(self, tokens, offset=0, limit=None):
+        matches = self._matches(tokens).order_by('-score', '-product_id')
+        stop = offset + limit if limit is not None else None
+        return [row['product_id'] for row in matches[offset:stop]]
+
+    def _token_rows(self, product):
+        weights = {}
+        for token in tokenize(product.product_name):
+            weights[token] = weights.get(token, 0) + NAME_WEIGHT
+        for token in tokenize(product.description):
+            weights[token] = weights.get(token, 0) + DESCRIPTION_WEIGHT
+        return [
+            ProductSearchToken(product_id=product.pk, token=token[:TOKEN_MAX_LENGTH], weight=weight)
+            for token, weight in weights.items()
+        ]
+
+    def index_products(self, products):
+        products = list(products)
+        if not products:
+            return
+        ProductSearchToken.objects.filter(product_id__in=[p.pk for p in products]).delete()
+        rows = [row for product in products for row in self._token_rows(product)]
+        ProductSearchToken.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+
+    def remove_products(self, product_ids):
+        ProductSearchToken.objects.filter(product_id__in=list(product_ids)).delete()
+
+    def clear(self):
+        ProductSearchToken.objects.all().delete()
+
+
+def get_backend():
+    if fts5_available():
+        return FTS5Backend()
+    return TokenTableBackend()
+
+
+def search_products(keyword):
+    """Ranked, paginator-friendly search results for a keyword string"""
+    return RankedResults(get_backend(), tokenize(keyword))
+
+
+def index_products(products):
+    """Add or refresh the index entries for the given products"""
+    with transaction.atomic():
+        get_backend().index_products(products)
+
+
+def remove_products(product_ids):
+    """Drop the index entries for the given product ids"""
+    get_backend().remove_products(product_ids)
+
+
+def rebuild_index(batch_size=1000, stdout=None):
+    """Rebuild the whole index from the Product table; returns the number of products indexed"""
+    backend = get_backend()
+    indexed = 0
+    with transaction.atomic():
+        backend.clear()
+        batch = []
+        for product in Product.objects.only('id', 'product_name', 'description').order_by('id').iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                backend.index_products(batch)
+                indexed += len(batch)
+                batch = []
+                if stdout:
+                    stdout.write(f'  Indexed {indexed} products')
+        backend.index_products(batch)
+        indexed += len(batch)
+    return indexed
@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from category import counters
+from . import autocomplete, export, facets, feed, search
+from .models import Product, Variation
+
+
+# Fields whose previous values the handlers below need to compare against.
+TRACKED_FIELDS = ('category_id', 'is_available', 'stock', 'product_name', 'slug')
+# Fields shown in autocomplete suggestions (name, and the URL built from slug and category).
+LISTED_FIELDS = ('product_name', 'slug', 'category_id', 'is_available')
+
+
+def _contribution(values):
+    return counters.product_contribution(values['category_id'], values['is_available'], values['stock'])
+
+
+@receiver(pre_save, sender=Product)
+def product_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if any(loaded.get(field, DEFERRED) is DEFERRED for field in TRACKED_FIELDS):
+        # Not loaded through the ORM (or loaded with .only()): read the stored row.
+        instance._loaded_values = Product.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first() or {}
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = {field: getattr(instance, field) for field in TRACKED_FIELDS}
+    previous = getattr(instance, '_loaded_values', {})
+    old = None if created or not previous else _contribution(previous)
+    counters.apply_changes([(old, _contribution(current))])
+    listed = created or any(previous.get(field) != current[field] for field in LISTED_FIELDS)
+    instance._loaded_values = {**previous, **current}
+
+    search.index_products([instance])
+    transaction.on_commit(lambda: facets.index_products([instance.pk]))
+    transaction.on_commit(feed.invalidate)
+    if listed:
+        transaction.on_commit(lambda: autocomplete.update_products([instance]))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    values = {
+        field: getattr(instance, field) if loaded.get(field, DEFERRED) is DEFERRED else loaded[field]
+        for field in TRACKED_FIELDS
+    }
+    counters.apply_changes([(_contribution(values), None)])
+
+    search.remove_products([instance.pk])
+    export.record_deletions([instance])
+    transaction.on_commit(feed.invalidate)
+    product_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.remove_products([product_id]))
+
+
+@receiver(post_save, sender=Variation)
+@receiver(post_delete, sender=Variation)
+def variation_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Variations are part of the product as exported and shown.
+    Product.objects.filter(pk=instance.product_id).update(modified_date=timezone.now())
+    # After commit: when the product itself is being deleted this finds
+    # nothing to index instead of racing the cascade.
+    product_id = instance.product_id
+    transaction.on_commit(lambda: facets.index_products([product_id]))
+
+
+@receiver(connection_created)
+def database_connected(sender, connection, **kwargs):
+    search.reset_fts5(connection)
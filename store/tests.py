@@ -1,3 +1,319 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from category.models import Category
+from orders.models import BoughtTogether
+from . import autocomplete, export, facets, search
+from .conditional import product_validator
+from .importer import ProductImporter
+from .models import DeletedProduct, Product, Variation
+from .pagination import KeysetPaginator, paginate_products
+
+
+def make_category(slug='shirts'):
+    return Category.objects.create(category_name=slug.title(), slug=slug)
+
+
+def make_product(name, category, **fields):
+    slug = fields.pop('slug', name.lower().replace(' ', '-'))
+    fields.setdefault('price', 10)
+    fields.setdefault('stock', 5)
+    return Product.objects.create(
+        product_name=name, slug=slug, category=category, images='photos/products/%s.jpg' % slug, **fields,
+    )
+
+
+@override_settings(AUTOCOMPLETE_REBUILD_INTERVAL=0)
+class AutocompleteTests(TestCase):
+
+    def setUp(self):
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+        # Rebuild inline: a thread wouldn't see the test transaction.
+        patcher = mock.patch.object(autocomplete, '_in_background', lambda function, *args: function(*args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.category = make_category()
+
+    def labels(self, prefix):
+        return [result['label'] for result in autocomplete.suggest(prefix)]
+
+    def test_word_tails_and_categories_first(self):
+        make_product('Blue cotton shirt', self.category)
+        make_product('Red shirt', self.category)
+        self.assertEqual(self.labels('shi'), ['Shirts', 'Blue cotton shirt', 'Red shirt'])
+        self.assertEqual(self.labels('cotton s'), ['Blue cotton shirt'])
+
+    def test_change_in_another_process_is_picked_up(self):
+        self.assertEqual(self.labels('linen'), [])
+        # Saved by "another process": the row changes and the shared version moves,
+        # but this process's index isn't touched (TestCase never runs on_commit).
+        index = autocomplete._index
+        make_product('Linen shirt', self.category)
+        autocomplete.invalidate()
+        self.assertIs(autocomplete._index, index)
+        # The old index answers the lookup that notices; the rebuilt one the next.
+        self.assertEqual(self.labels('linen'), [])
+        self.assertIsNot(autocomplete._index, index)
+        self.assertEqual(self.labels('linen'), ['Linen shirt'])
+
+    @override_settings(AUTOCOMPLETE_REBUILD_INTERVAL=60)
+    def test_warm_lookups_skip_the_database_and_cache(self):
+        self.labels('shi')
+        with self.assertNumQueries(0):
+            self.labels('shi')
+
+    def save(self, product):
+        """Save and run the on_commit callbacks it registers (TestCase never commits)"""
+        start = len(connection.run_on_commit)
+        product.save()
+        for _, callback in connection.run_on_commit[start:]:
+            callback()
+
+    def test_only_listing_changes_move_the_version(self):
+        product = make_product('Linen shirt', self.category)
+        self.labels('linen')
+        version = autocomplete.index_version()
+        product.stock = 1
+        self.save(product)
+        self.assertEqual(autocomplete.index_version(), version)
+
+        product.product_name = 'Linen blouse'
+        self.save(product)
+        # This process has the change already, so it adopts the new version.
+        self.assertNotEqual(autocomplete.index_version(), version)
+        self.assertEqual(autocomplete._index.version, autocomplete.index_version())
+        self.assertEqual(self.labels('linen b'), ['Linen blouse'])
+
+
+class ImporterTests(TestCase):
+
+    def setUp(self):
+        self.category = make_category()
+        self.errors = []
+
+    def run_import(self, rows):
+        importer = ProductImporter(on_error=lambda line, message: self.errors.append((line, message)))
+        return importer.run(enumerate(rows, 1))
+
+    def row(self, name, **fields):
+        return {'product_name': name, 'price': '10', 'stock': '3', 'category': 'shirts', **fields}
+
+    def test_generated_slug_avoids_explicit_slugs_in_the_batch(self):
+        make_product('Old', self.category, slug='blue-shirt-2')
+        stats = self.run_import([
+            self.row('Blue Shirt'),
+            self.row('Blue Shirt'),
+            self.row('Another', slug='blue-shirt'),
+        ])
+        self.assertEqual((stats.created, self.errors), (3, []))
+        self.assertEqual(
+            sorted(Product.objects.filter(product_name='Blue Shirt').values_list('slug', flat=True)),
+            ['blue-shirt-3', 'blue-shirt-4'],
+        )
+        self.assertEqual(Product.objects.get(slug='blue-shirt').product_name, 'Another')
+
+    def test_invalid_slugs_are_reported(self):
+        stats = self.run_import([
+            self.row('Spaces', slug='not a slug'),
+            self.row('Long', slug='x' * 201),
+            self.row('Fine', slug='fine_slug-1'),
+        ])
+        self.assertEqual((stats.created, stats.skipped), (1, 2))
+        self.assertEqual([line for line, _ in self.errors], [1, 2])
+        self.assertIn('invalid slug', self.errors[0][1])
+        self.assertTrue(Product.objects.filter(slug='fine_slug-1').exists())
+
+
+class SearchTestsMixin:
+
+    def setUp(self):
+        self.category = make_category()
+        self.name_match = make_product('Linen shirt', self.category, description='Light summer wear')
+        self.description_match = make_product('Summer dress', self.category, description='Goes with a linen jacket')
+        make_product('Wool coat', self.category, description='Warm')
+
+    def ids(self, keyword):
+        return [product.pk for product in search.search_products(keyword)[:10]]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.ids('linen'), [self.name_match.pk, self.description_match.pk])
+        self.assertEqual(search.search_products('linen').count(), 2)
+
+    def test_every_token_must_match(self):
+        self.assertEqual(self.ids('linen jacket'), [self.description_match.pk])
+        self.assertEqual(self.ids('linen wool'), [])
+
+    def test_prefix_queries(self):
+        self.assertEqual(self.ids('lin'), [self.name_match.pk, self.description_match.pk])
+        self.assertEqual(self.ids('sum dre'), [self.description_match.pk])
+        self.assertEqual(search.search_products('wo').count(), 1)
+
+
+class TokenTableSearchTests(SearchTestsMixin, TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(search, 'fts5_available', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def test_uses_token_table(self):
+        self.assertIsInstance(search.get_backend(), search.TokenTableBackend)
+
+
+class FTS5SearchTests(SearchTestsMixin, TestCase):
+
+    def setUp(self):
+        if not search.fts5_available():
+            self.skipTest('SQLite without FTS5')
+        super().setUp()
+
+    def test_availability_is_looked_up_per_connection(self):
+        connection.store_fts5_available = False
+        self.assertIsInstance(search.get_backend(), search.TokenTableBackend)
+        search.reset_fts5(connection)
+        self.assertIsInstance(search.get_backend(), search.FTS5Backend)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        category = make_category()
+        # Three prices for seven products: most sort keys tie and only the id breaks them.
+        self.products = [
+            make_product('Shirt %d' % n, category, price=[20, 10, 10][n % 3]) for n in range(7)
+        ]
+        self.paginator = KeysetPaginator(Product.objects.all(), 2, ('-price', '-id'))
+        self.expected = [p.pk for p in sorted(self.products, key=lambda p: (-p.price, -p.pk))]
+
+    def ids(self, page):
+        return [product.pk for product in page]
+
+    def test_ties_are_broken_by_id_in_both_directions(self):
+        pages = [self.paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], self.expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+        page = pages[-1]
+        backwards = []
+        while page.has_previous():
+            page = self.paginator.get_page(page.previous_cursor)
+            backwards.append(self.ids(page))
+        self.assertEqual(backwards, [self.ids(page) for page in pages[-2::-1]])
+
+    def test_invalid_cursor_gives_the_first_page(self):
+        first = self.ids(self.paginator.get_page())
+        wrong_length = KeysetPaginator(Product.objects.all(), 2, ('id',)).get_page().next_cursor
+        for cursor in ('garbage', '!!!', 'WyJuZXh0IiwiYWJjIl0', wrong_length):
+            with self.subTest(cursor=cursor):
+                page = self.paginator.get_page(cursor)
+                self.assertEqual(self.ids(page), first)
+                self.assertFalse(page.has_previous())
+
+    def test_paginate_products_uses_cursor_when_asked(self):
+        request = RequestFactory().get('/store/', {'cursor': 'garbage'})
+        page = paginate_products(request, Product.objects.all(), len(self.products), ('-price', '-id'))
+        self.assertTrue(getattr(page, 'is_cursor_page', False))
+        self.assertEqual(len(page), min(len(self.products), page.paginator.per_page))
+
+
+class FacetCountTests(TestCase):
+
+    def setUp(self):
+        self.category = make_category()
+        self.other_category = make_category('pants')
+        self.add('Red S', self.category, 20, 'Red', 'S')
+        self.add('Red M', self.category, 20, 'Red', 'M')
+        self.add('Blue M', self.category, 120, 'Blue', 'M')
+        self.add('Blue M sold out', self.category, 20, 'Blue', 'M', stock=0)
+        self.add('Red M pants', self.other_category, 20, 'Red', 'M')
+
+    def add(self, name, category, price, color, size, stock=5):
+        product = make_product(name, category, price=price, stock=stock)
+        Variation.objects.create(product=product, variation_category='color', variation_value=color)
+        Variation.objects.create(product=product, variation_category='size', variation_value=size)
+        # Facet rows are written on commit, which TestCase never reaches.
+        facets.index_products([product.pk])
+
+    def counts(self, filters, category=None):
+        return {
+            facet['name']: {option['value']: option['count'] for option in facet['options']}
+            for facet in facets.facet_counts(filters, category)
+        }
+
+    def test_each_facet_is_counted_under_the_other_filters(self):
+        counts = self.counts({'color': ['Red'], 'size': ['M']}, self.category)
+        # Every color with size M, every size with color Red.
+        self.assertEqual(counts['color'], {'Red': 1, 'Blue': 2})
+        self.assertEqual(counts['size'], {'S': 1, 'M': 1})
+        # The other facets are narrowed by both.
+        self.assertEqual(counts['price'], {'0-50': 1})
+        self.assertEqual(counts['availability'], {'in_stock': 1})
+
+    def test_filtered_products_match_the_counts(self):
+        filters = {'color': ['Blue'], 'size': ['M'], 'availability': ['in_stock']}
+        products = facets.filter_products(Product.objects.filter(category=self.category), filters)
+        self.assertEqual([p.product_name for p in products], ['Blue M'])
+        self.assertEqual(self.counts(filters, self.category)['price'], {'100-150': 1})
+
+    def test_counts_without_a_category_span_the_catalog(self):
+        self.assertEqual(self.counts({'color': ['Red']})['size'], {'S': 1, 'M': 2})
+
+
+class CatalogFeedTests(TestCase):
+
+    def setUp(self):
+        category = make_category()
+        self.kept = make_product('Kept shirt', category)
+        self.deleted = make_product('Deleted shirt', category)
+
+    def records(self, since=None):
+        return [json.loads(line) for line in export.generate_feed('jsonl', since=since)]
+
+    def test_incremental_feed_reports_deletions(self):
+        since = timezone.now()
+        deleted_id = self.deleted.pk
+        self.deleted.delete()
+
+        [tombstone] = self.records(since)
+        self.assertEqual(
+            (tombstone['id'], tombstone['slug'], tombstone['availability']), (deleted_id, 'deleted-shirt', 'deleted'),
+        )
+        self.assertEqual([record['id'] for record in self.records()], [self.kept.pk])
+
+    def test_command_writes_to_its_stdout(self):
+        out = StringIO()
+        call_command('export_catalog', format='xml', stdout=out)
+        self.assertTrue(out.getvalue().startswith('<?xml'))
+        self.assertIn('<slug>kept-shirt</slug>', out.getvalue())
+
+    def test_expired_tombstones_are_dropped(self):
+        self.deleted.delete()
+        DeletedProduct.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+        self.kept.delete()
+        self.assertEqual(list(DeletedProduct.objects.values_list('slug', flat=True)), ['kept-shirt'])
+
+
+class ProductValidatorTests(TestCase):
+
+    def test_changes_when_a_bought_together_product_changes(self):
+        category = make_category()
+        product = make_product('Shirt', category)
+        related = make_product('Hat', category)
+        BoughtTogether.objects.create(product=product, related=related, rank=0, count=1)
+        before = product_validator(None, 'shirts', 'shirt')
+
+        Product.objects.filter(pk=related.pk).update(
+            price=99, modified_date=timezone.now() + timedelta(seconds=1),
+        )
+        self.assertGreater(product_validator(None, 'shirts', 'shirt'), before)
@@ -7,4 +7,6 @@ urlpatterns = [
     path('category/<slug:category_slug>/', views.store, name='products_by_category'),
     path('category/<slug:category_slug>/<slug:product_slug>/', views.product_detail, name='product_detail'),
     path('search/', views.search, name='search'),
+    path('autocomplete/', views.autocomplete_search, name='autocomplete'),
+    path('feed.<str:feed_format>', views.catalog_feed, name='catalog_feed'),
 ]
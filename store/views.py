@@ -1,12 +1,22 @@
+import datetime
+
 from django.shortcuts import get_object_or_404, render
+from django.http import Http404, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
 from .models import Product
 from category.models import Category
-from carts.views import _cart_id
 from carts.models import CartItem
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.db.models import Q
+from orders.recommendations import bought_together
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Sum
+from .pagination import paginate_products
+from . import autocomplete, export, facets
+from .conditional import catalog_condition, product_validator, store_validator
+from .search import search_products
 # Create your views here.
 
+@catalog_condition(store_validator)
 def store(request, category_slug=None):
     categories=None
     products=None
@@ -14,50 +24,82 @@ def store(request, category_slug=None):
 
     if category_slug!=None:
         categories=get_object_or_404(Category, slug=category_slug)
-        products=Product.objects.filter(category=categories, is_available=True)
-        paginator=Paginator(products, 6)
-        page=request.GET.get('page')
-        paged_products=paginator.get_page(page)
-        product_count=products.count()
-
+        products=Product.objects.filter(category=categories, is_available=True).select_related('category')
+        product_count=categories.product_count
     else:
-        products=Product.objects.all().filter(is_available=True).order_by('id')
-        paginator=Paginator(products, 6)
-        page=request.GET.get('page')
-        paged_products=paginator.get_page(page)
+        products=Product.objects.all().filter(is_available=True).select_related('category')
+        product_count=Category.objects.aggregate(total=Sum('product_count'))['total'] or 0
+
+    filters=facets.parse_filters(request.GET)
+    if filters:
+        products=facets.filter_products(products, filters)
         product_count=products.count()
 
+    paged_products=paginate_products(request, products, product_count)
+
     context={
         'products': paged_products,
-        'product_count': product_count
+        'product_count': product_count if settings.STORE_SHOW_PRODUCT_COUNT else None,
+        'facets': facets.facet_counts(filters, category=categories),
     }
 
     return render(request, 'store/store.html', context)
 
+@catalog_condition(product_validator)
 def product_detail(request, category_slug, product_slug):
-
-    try:
-        single_product=Product.objects.get(category__slug=category_slug, slug=product_slug)
-        in_cart=CartItem.objects.filter(cart__cart_id=_cart_id(request), product=single_product).exists()
-    except Exception as e:
-        raise e
+    single_product=get_object_or_404(Product.objects.with_detail(), category__slug=category_slug, slug=product_slug)
+    if request.user.is_authenticated:
+        in_cart=CartItem.objects.filter(user=request.user, is_active=True, product=single_product).exists()
+    else:
+        in_cart=single_product.id in request.anonymous_cart
 
     context={
         'single_product': single_product,
-        'in_cart': in_cart
+        'variation_groups': single_product.variation_groups(),
+        'in_cart': in_cart,
+        'bought_together': bought_together(single_product),
     }
 
     return render(request, 'store/product_detail.html', context)
 
 def search(request):
-    if 'keyword' in request.GET:
-        keyword=request.GET['keyword']
-        if keyword:
-            products=Product.objects.order_by('-created_date').filter(Q(description__icontains=keyword) | Q(product_name__icontains=keyword))
-            product_count=products.count()
+    keyword=request.GET.get('keyword', '').strip()
+    products=search_products(keyword)
+    paginator=Paginator(products, settings.STORE_PRODUCTS_PER_PAGE)
+    page=request.GET.get('page')
+    paged_products=paginator.get_page(page)
+    product_count=paginator.count
+
     context={
-        'products': products,
+        'products': paged_products,
         'product_count': product_count,
+        'keyword': keyword,
     }
     return render(request, 'store/store.html', context)
 
+
+def autocomplete_search(request):
+    keyword = request.GET.get('q', '')
+    return JsonResponse({'results': autocomplete.suggest(keyword)})
+
+
+def catalog_feed(request, feed_format):
+    if feed_format not in export.FORMATS:
+        raise Http404
+    last_modified=export.last_modified()
+    since=parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if since is not None:
+        if last_modified is not None and int(last_modified.timestamp()) <= since:
+            response=HttpResponseNotModified()
+            response['Last-Modified']=http_date(last_modified.timestamp())
+            return response
+        since=datetime.datetime.fromtimestamp(since, tz=datetime.timezone.utc)
+
+    base_url=request.build_absolute_uri('/')
+    response=StreamingHttpResponse(
+        export.generate_feed(feed_format, since=since, base_url=base_url),
+        content_type=export.FORMATS[feed_format],
+    )
+    if last_modified is not None:
+        response['Last-Modified']=http_date(last_modified.timestamp())
+    return response